@@ -1,4 +1,8 @@
 import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -24,17 +28,242 @@ class Config:
     # Database connection string
     DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     
+    # Connection pool settings
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))  # Seconds before a connection is recycled
+    
+    # Threads running independent reads concurrently (DatabaseConfig.gather); 1 runs them in sequence
+    DB_FANOUT_WORKERS = int(os.environ.get('DB_FANOUT_WORKERS', 4))
+    
     # Recommendation settings
     KNN_K_VALUE = int(os.environ.get('KNN_K_VALUE', 3))
+    
+    # Nearest-neighbour search: 'index' (exact block-max KNN index), 'inverted' (exact postings lists
+    # with MaxScore pruning), 'ivf' (approximate) or 'brute' (full scan). The full scan is faster
+    # on small catalogs (tests/benchmark_recommender.py); switch to an index for large ones
+    KNN_ALGORITHM = os.environ.get('KNN_ALGORITHM', 'brute')
+    KNN_BLOCK_SIZE = int(os.environ.get('KNN_BLOCK_SIZE', 16))
+    
+    # IVF approximate search: more probes = higher recall, slower queries
+    IVF_LISTS = int(os.environ.get('IVF_LISTS', 0))  # 0 = sqrt(product count)
+    IVF_PROBES = int(os.environ.get('IVF_PROBES', 8))
+    IVF_TRAIN_SAMPLE = int(os.environ.get('IVF_TRAIN_SAMPLE', 20000))
+    IVF_ITERATIONS = int(os.environ.get('IVF_ITERATIONS', 5))
     MAX_RECOMMENDATIONS = int(os.environ.get('MAX_RECOMMENDATIONS', 10))
     
+    # Paged recommendations: products ranked once per profile, then sliced per page
+    RECOMMENDATION_CANDIDATE_LIMIT = int(os.environ.get('RECOMMENDATION_CANDIDATE_LIMIT', 500))
+    RECOMMENDATIONS_PER_PAGE = int(os.environ.get('RECOMMENDATIONS_PER_PAGE', 12))
+    RECOMMENDATION_MIN_SIMILARITY = float(os.environ.get('RECOMMENDATION_MIN_SIMILARITY', 0.0))  # Listed only above this
+    
+    # TF-IDF vocabulary size (0 = every term); the matrix is float32 and L2-normalized
+    TFIDF_MAX_FEATURES = int(os.environ.get('TFIDF_MAX_FEATURES', 1000))
+    
+    # Seconds between polls for products changed by the importer or other nodes (0 disables)
+    CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 5))
+    
+    # Full TF-IDF refit once incremental edits drift the vocabulary this much
+    TFIDF_REFIT_DRIFT_THRESHOLD = float(os.environ.get('TFIDF_REFIT_DRIFT_THRESHOLD', 0.1))
+    
+    # Larger changesets are handed to a background rebuild instead of patching the live model
+    CATALOG_PATCH_MAX_CHANGES = int(os.environ.get('CATALOG_PATCH_MAX_CHANGES', 1000))
+    
+    # Hybrid scoring: blend content similarity with min-max normalized product signals
+    HYBRID_SCORING = os.environ.get('HYBRID_SCORING', 'False').lower() == 'true'
+    HYBRID_WEIGHTS = {
+        'content': float(os.environ.get('HYBRID_WEIGHT_CONTENT', 0.7)),
+        'price': float(os.environ.get('HYBRID_WEIGHT_PRICE', 0.0)),  # Cheaper scores higher
+        'rating': float(os.environ.get('HYBRID_WEIGHT_RATING', 0.15)),
+        'terjual': float(os.environ.get('HYBRID_WEIGHT_TERJUAL', 0.1)),
+        'reviews': float(os.environ.get('HYBRID_WEIGHT_REVIEWS', 0.05))
+    }
+    
+    # Cached product totals per brand (admin listing), also dropped on every product write
+    PRODUCT_AGGREGATE_TTL = int(os.environ.get('PRODUCT_AGGREGATE_TTL', 60))  # Seconds
+    
+    # Served recommendations log: queued in process, inserted in batches by a background thread
+    RECOMMENDATION_LOG_QUEUE_SIZE = int(os.environ.get('RECOMMENDATION_LOG_QUEUE_SIZE', 10000))  # Queued requests (0 disables)
+    RECOMMENDATION_LOG_BATCH_SIZE = int(os.environ.get('RECOMMENDATION_LOG_BATCH_SIZE', 500))  # Rows per insert
+    RECOMMENDATION_LOG_FLUSH_INTERVAL = float(os.environ.get('RECOMMENDATION_LOG_FLUSH_INTERVAL', 2))  # Seconds
+    RECOMMENDATION_LOG_PUT_TIMEOUT = float(os.environ.get('RECOMMENDATION_LOG_PUT_TIMEOUT', 0.05))  # Seconds before dropping
+    
+    # Seconds between recounts of the admin dashboard counters (0 disables)
+    STATS_RECONCILE_INTERVAL = float(os.environ.get('STATS_RECONCILE_INTERVAL', 300))
+    
+    # Row positions of filtered candidate sets kept per model (bytes)
+    CANDIDATE_CACHE_BYTES = int(os.environ.get('CANDIDATE_CACHE_BYTES', 16 * 1024 * 1024))
+    
+    # Recommendation result cache (entries are dropped whenever the model is rebuilt)
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 1024))
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))  # Seconds
+    
+    # Serve keyword-free profiles from precomputed_recommendations (database/precompute_recommendations.py)
+    USE_PRECOMPUTED_RECOMMENDATIONS = os.environ.get('USE_PRECOMPUTED_RECOMMENDATIONS', 'True').lower() == 'true'
+    PRECOMPUTED_TOP_N = int(os.environ.get('PRECOMPUTED_TOP_N', 50))
+    
+    # Similarity values held in memory per chunk by batch scoring (4 bytes each)
+    BATCH_SCORE_MAX_CELLS = int(os.environ.get('BATCH_SCORE_MAX_CELLS', 16 * 1024 * 1024))
+    
+    # Prebuilt recommender model (see database/build_recommender_artifacts.py)
+    RECOMMENDER_ARTIFACT_DIR = os.environ.get(
+        'RECOMMENDER_ARTIFACT_DIR',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database', 'artifacts')
+    )
+    
+    # Cleaned product text keyed by content hash, so rebuilds only clean changed rows ('' disables)
+    CLEANED_TEXT_CACHE = os.environ.get(
+        'CLEANED_TEXT_CACHE', os.path.join(RECOMMENDER_ARTIFACT_DIR, 'cleaned_text.npz')
+    )
+    
     # Upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
+class PoolExhaustedError(Exception):
+    """No pooled connection became free within the pool timeout"""
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections"""
+    
+    def __init__(self, connect, size, timeout, max_lifetime):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = deque()  # (connection, created_at), most recently used last
+        self._lock = threading.Lock()
+        self._in_use = {}  # id(connection) -> created_at
+        self._stats = {
+            'created': 0,
+            'discarded': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+    
+    def acquire(self):
+        """Check out a healthy connection, waiting up to the pool timeout
+        
+        Raises PoolExhaustedError when every connection stays in use; returns
+        None when a new connection cannot be opened.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise PoolExhaustedError(f"Database pool exhausted: no connection within {self.timeout}s")
+        
+        waited = time.monotonic() - started
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        
+        try:
+            connection, created_at = self._checkout_idle() or self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        
+        if connection is None:
+            self._slots.release()
+            return None
+        
+        with self._lock:
+            self._in_use[id(connection)] = created_at
+        return connection
+    
+    def release(self, connection, healthy=True):
+        """Return a connection to the pool, discarding it if unusable"""
+        try:
+            with self._lock:
+                created_at = self._in_use.pop(id(connection), None)
+            
+            if healthy and created_at is not None and not self._expired(created_at):
+                try:
+                    # Reset: never hand out a connection with an open transaction
+                    if connection.in_transaction:
+                        connection.rollback()
+                    with self._lock:
+                        self._idle.append((connection, created_at))
+                    return
+                except Exception:
+                    pass
+            self._discard(connection)
+        finally:
+            self._slots.release()
+    
+    def stats(self):
+        """Return pool usage and wait-time metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['in_use'] = len(self._in_use)
+            stats['idle'] = len(self._idle)
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+    
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._discard(connection)
+    
+    def _checkout_idle(self):
+        """Pop the most recently used idle connection that is still alive"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, created_at = self._idle.pop()
+            
+            if self._expired(created_at):
+                self._discard(connection)
+                continue
+            
+            try:
+                # Health check on checkout
+                connection.ping(reconnect=False)
+            except Exception:
+                self._discard(connection)
+                continue
+            return connection, created_at
+    
+    def _open(self):
+        """Open a new connection for an acquired slot"""
+        connection = self._connect()
+        if connection is None:
+            return None, None
+        with self._lock:
+            self._stats['created'] += 1
+        return connection, time.monotonic()
+    
+    def _expired(self, created_at):
+        return time.monotonic() - created_at > self.max_lifetime
+    
+    def _discard(self, connection):
+        with self._lock:
+            self._stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
 class DatabaseConfig:
     """Database connection configuration"""
     
+    _pool = None
+    _pool_lock = threading.Lock()
+    _fanout = None
+    _fanout_state = threading.local()
+    
     @staticmethod
     def get_connection():
         """Get MySQL database connection"""
@@ -56,13 +285,80 @@ class DatabaseConfig:
             print(f"Error connecting to MySQL: {e}")
             return None
     
+    @staticmethod
+    def get_pool():
+        """Get the process-wide connection pool (recreated after fork)"""
+        pool = DatabaseConfig._pool
+        if pool is None or pool.pid != os.getpid():
+            with DatabaseConfig._pool_lock:
+                pool = DatabaseConfig._pool
+                if pool is None or pool.pid != os.getpid():
+                    pool = ConnectionPool(
+                        DatabaseConfig.get_connection,
+                        size=Config.DB_POOL_SIZE,
+                        timeout=Config.DB_POOL_TIMEOUT,
+                        max_lifetime=Config.DB_POOL_MAX_LIFETIME
+                    )
+                    DatabaseConfig._pool = pool
+        return pool
+    
+    @staticmethod
+    def get_fanout_executor():
+        """Get the process-wide thread pool for concurrent reads (recreated after fork)"""
+        fanout = DatabaseConfig._fanout
+        if fanout is None or fanout[0] != os.getpid():
+            with DatabaseConfig._pool_lock:
+                fanout = DatabaseConfig._fanout
+                if fanout is None or fanout[0] != os.getpid():
+                    executor = ThreadPoolExecutor(max_workers=Config.DB_FANOUT_WORKERS,
+                                                  thread_name_prefix='db-fanout')
+                    fanout = (os.getpid(), executor)
+                    DatabaseConfig._fanout = fanout
+        return fanout[1]
+    
+    @staticmethod
+    def gather(*calls):
+        """Run independent reads concurrently, each on its own pooled connection
+        
+        Each call is a zero-argument callable (a model method wrapped in
+        functools.partial or a lambda); results come back in call order, so
+        latency is that of the slowest call. The first call runs on the
+        calling thread. Calls made from inside a fan-out worker run in
+        sequence, so nested groups never wait on their own threads.
+        """
+        if (len(calls) < 2 or Config.DB_FANOUT_WORKERS < 2
+                or getattr(DatabaseConfig._fanout_state, 'active', False)):
+            return [call() for call in calls]
+        
+        executor = DatabaseConfig.get_fanout_executor()
+        futures = [executor.submit(DatabaseConfig._run_fanout_call, call) for call in calls[1:]]
+        first = calls[0]()
+        return [first] + [future.result() for future in futures]
+    
+    @staticmethod
+    def _run_fanout_call(call):
+        """Run one gathered call on a fan-out worker thread"""
+        DatabaseConfig._fanout_state.active = True
+        try:
+            return call()
+        finally:
+            DatabaseConfig._fanout_state.active = False
+    
+    @staticmethod
+    def pool_stats():
+        """Get connection pool metrics"""
+        return DatabaseConfig.get_pool().stats()
+    
     @staticmethod
     def execute_query(query, params=None, fetch=False):
-        """Execute database query"""
-        connection = DatabaseConfig.get_connection()
+        """Execute database query (raises PoolExhaustedError rather than returning an empty result)"""
+        pool = DatabaseConfig.get_pool()
+        connection = pool.acquire()
         if not connection:
             return None
         
+        cursor = None
+        healthy = True
         try:
             cursor = connection.cursor(dictionary=True)
             cursor.execute(query, params or ())
@@ -74,31 +370,62 @@ class DatabaseConfig:
                     result = cursor.fetchone()
             else:
                 result = cursor.rowcount
-                
+            
             connection.commit()
             return result
-                
+            
         except Exception as e:
             print(f"Database error: {e}")
+            healthy = False
             if hasattr(connection, 'rollback'):
-                connection.rollback()
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
             return None
         finally:
-            if connection:
-                if hasattr(connection, 'is_connected'):
-                    if connection.is_connected():
-                        cursor.close()
-                        connection.close()
-                else:
-                    connection.close()
+            DatabaseConfig._close_cursor(cursor)
+            pool.release(connection, healthy)
+    
+    @staticmethod
+    def execute_insert(query, params=None):
+        """Execute INSERT query and return the new row id (raises PoolExhaustedError)"""
+        pool = DatabaseConfig.get_pool()
+        connection = pool.acquire()
+        if not connection:
+            return None
+        
+        cursor = None
+        healthy = True
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params or ())
+            connection.commit()
+            return cursor.lastrowid
+            
+        except Exception as e:
+            print(f"Database error: {e}")
+            healthy = False
+            if hasattr(connection, 'rollback'):
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
+            return None
+        finally:
+            DatabaseConfig._close_cursor(cursor)
+            pool.release(connection, healthy)
     
     @staticmethod
     def execute_many(query, data_list):
-        """Execute multiple queries with data list"""
-        connection = DatabaseConfig.get_connection()
+        """Execute multiple queries with data list (raises PoolExhaustedError)"""
+        pool = DatabaseConfig.get_pool()
+        connection = pool.acquire()
         if not connection:
             return False
         
+        cursor = None
+        healthy = True
         try:
             cursor = connection.cursor()
             cursor.executemany(query, data_list)
@@ -107,17 +434,26 @@ class DatabaseConfig:
             
         except Exception as e:
             print(f"Database error: {e}")
+            healthy = False
             if hasattr(connection, 'rollback'):
-                connection.rollback()
+                try:
+                    connection.rollback()
+                except Exception:
+                    pass
             return False
         finally:
-            if connection:
-                if hasattr(connection, 'is_connected'):
-                    if connection.is_connected():
-                        cursor.close()
-                        connection.close()
-                else:
-                    connection.close()
+            DatabaseConfig._close_cursor(cursor)
+            pool.release(connection, healthy)
+    
+    @staticmethod
+    def _close_cursor(cursor):
+        """Close cursor, ignoring errors from a broken connection"""
+        if cursor is None:
+            return
+        try:
+            cursor.close()
+        except Exception:
+            pass
     
     @staticmethod
     def init_database():
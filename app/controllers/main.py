@@ -1,16 +1,23 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 import mysql.connector
-from app.config.config import Config
+from app.config.config import Config, DatabaseConfig, PoolExhaustedError
 from app.models.models import User, Admin, Product, UserPreference
-from app.utils.recommender import SkincareRecommender
+from app.utils.recommender import SkincareRecommender, shared_recommender
+from app.utils.stats import dashboard_stats
+from app.utils.recommendation_log import recommendation_log
 import os
+from functools import partial
 
 app = Flask(__name__, template_folder='../views/templates', static_folder='../../static')
 app.config.from_object(Config)
 
-# Initialize recommender
-recommender = SkincareRecommender()
+# Shared recommender model, swapped in the background when the catalog changes
+recommender = shared_recommender
+
+# Query parameters carried by the pagination links of each listing
+RECOMMENDATION_PAGE_ARGS = ('search', 'sort_by', 'min_price', 'max_price', 'brand', 'marketplace', 'min_rating')
+PRODUCT_PAGE_ARGS = ('search', 'brand', 'sort')
 
 @app.route('/')
 def index():
@@ -88,14 +95,21 @@ def logout():
     session.clear()
     return redirect(url_for('index'))
 
+def record_served(user_id, recommendations):
+    """Count and log the recommendations shown to a user (logged in the background)"""
+    dashboard_stats.record_served(len(recommendations))
+    recommendation_log.record(user_id, recommendations)
+
 @app.route('/user/dashboard')
 def user_dashboard():
     """User dashboard"""
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user = User.get_by_id(session['user_id'])
-    user_preferences = UserPreference.get_by_user_id(session['user_id'])
+    user, user_preferences = DatabaseConfig.gather(
+        partial(User.get_by_id, session['user_id']),
+        partial(UserPreference.get_by_user_id, session['user_id'])
+    )
     
     # Calculate recommendation count if preferences exist
     recommendation_count = 0
@@ -103,24 +117,13 @@ def user_dashboard():
     
     if user_preferences:
         try:
-            from recommender import SkincareRecommender
-            recommender = SkincareRecommender()
-            
             # Convert user_preferences dict to include rentang_harga
             preferences_dict = dict(user_preferences)
             
-            # Create rentang_harga based on budget range
-            budget_max = preferences_dict.get('budget_max', 1000000)
-            if budget_max <= 50000:
-                preferences_dict['rentang_harga'] = '0-50000'
-            elif budget_max <= 100000:
-                preferences_dict['rentang_harga'] = '50000-100000'
-            elif budget_max <= 200000:
-                preferences_dict['rentang_harga'] = '100000-200000'
-            elif budget_max <= 500000:
-                preferences_dict['rentang_harga'] = '200000-500000'
-            else:
-                preferences_dict['rentang_harga'] = '500000+'
+            # Fall back to a band derived from the budget when none is saved
+            if not preferences_dict.get('rentang_harga'):
+                preferences_dict['rentang_harga'] = SkincareRecommender.price_band(
+                    preferences_dict.get('budget_max'))
             
             # Ensure all required fields are present with defaults
             required_fields = {
@@ -135,9 +138,13 @@ def user_dashboard():
                 if field not in preferences_dict or preferences_dict[field] is None:
                     preferences_dict[field] = default_value
             
-            recommendations = recommender.get_recommendations(preferences_dict)
+            recommendations = recommender.get_recommendations(
+                preferences_dict,
+                filters=SkincareRecommender.price_band_filters(preferences_dict['rentang_harga'])
+            )
             recommendation_count = len(recommendations)
             recent_recommendations = recommendations[:3]  # Get first 3 for display
+            record_served(session['user_id'], recent_recommendations)
         except Exception as e:
             print(f"Error getting recommendations: {e}")
             recommendation_count = 0
@@ -199,30 +206,29 @@ def get_recommendations():
     # Override budget range if URL parameters are provided
     if min_price is not None or max_price is not None:
         budget_min = min_price if min_price is not None else preferences.get('budget_min', 0)
-        budget_max = max_price if max_price is not None else preferences.get('budget_max', 1000000)
+        budget_max = max_price if max_price is not None else preferences.get('budget_max')
         
         # Update preferences with new budget range
         preferences['budget_min'] = budget_min
         preferences['budget_max'] = budget_max
+        preferences['rentang_harga'] = SkincareRecommender.price_band(budget_max)
+        filters = {'min_price': budget_min, 'max_price': budget_max}
     else:
-        budget_min = preferences.get('budget_min', 0)
-        budget_max = preferences.get('budget_max', 1000000)
-    
-    # Create rentang_harga based on budget range
-    if budget_max <= 50000:
-        preferences['rentang_harga'] = '0-50000'
-    elif budget_max <= 100000:
-        preferences['rentang_harga'] = '50000-100000'
-    elif budget_max <= 200000:
-        preferences['rentang_harga'] = '100000-200000'
-    elif budget_max <= 500000:
-        preferences['rentang_harga'] = '200000-500000'
-    else:
-        preferences['rentang_harga'] = '500000+'
-    
-    # Add search query to preferences if provided
+        # Use the budget band saved with the preferences
+        if not preferences.get('rentang_harga'):
+            preferences['rentang_harga'] = SkincareRecommender.price_band(preferences.get('budget_max'))
+        filters = SkincareRecommender.price_band_filters(preferences['rentang_harga'])
+    
+    # Hard filters are applied inside the recommender, before ranking
+    filters['brand'] = request.args.get('brand', '').strip() or None
+    filters['marketplace'] = request.args.get('marketplace', '').strip() or None
+    filters['min_rating'] = request.args.get('min_rating', type=float)
+    
+    # Add search query to preferences if provided: it steers the ranking and limits
+    # the candidates to products matching every search term
     if search_query:
         preferences['kata_kunci'] = search_query
+        filters['search'] = search_query
     
     # Ensure all required fields are present with defaults
     required_fields = {
@@ -239,19 +245,20 @@ def get_recommendations():
     
     # Get recommendations with user's preferred k_value
     user_k_value = preferences.get('k_value', 3)
-    recommendations = recommender.get_recommendations(preferences, k_value=user_k_value)
+    page = request.args.get('page', 1, type=int)
     
-    # Apply sorting based on URL parameter
-    if sort_by == 'price_low':
-        recommendations.sort(key=lambda x: x['product']['price'])
-    elif sort_by == 'price_high':
-        recommendations.sort(key=lambda x: x['product']['price'], reverse=True)
-    elif sort_by == 'rating':
-        recommendations.sort(key=lambda x: x['product']['rating'], reverse=True)
-    # Default is 'score' which is already sorted by the recommender
+    # Sorting and paging run over a ranked candidate set cached per profile
+    pagination = recommender.get_recommendation_page(
+        preferences, page=page, sort_by=sort_by, k_value=user_k_value, filters=filters
+    )
+    # Only known filters are carried by the pager links: other keys would become url_for options
+    page_args = {key: request.args[key] for key in RECOMMENDATION_PAGE_ARGS if request.args.get(key)}
+    record_served(session['user_id'], pagination['recommendations'])
     
     return render_template('user/recommendations.html', 
-                         recommendations=recommendations, 
+                         recommendations=pagination['recommendations'], 
+                         pagination=pagination,
+                         page_args=page_args,
                          preferences=preferences)
 
 @app.route('/admin/dashboard')
@@ -260,27 +267,18 @@ def admin_dashboard():
     if 'admin_id' not in session:
         return redirect(url_for('admin_login'))
     
-    # Get statistics
-    total_users = User.count()
-    total_products = Product.count()
-    total_preferences = UserPreference.count()
-    
-    # Get users created today (simplified - using total for now)
-    new_users_today = 0  # Could be enhanced with date filtering
-    
-    # Get recommendation statistics (simplified - using placeholder values)
-    total_recommendations = total_preferences * 10  # Estimate based on preferences
-    recommendations_today = 0  # Could be enhanced with actual tracking
+    # Live counters, kept current by model writes and periodic recounts
+    counters = dashboard_stats.snapshot()
     
     stats = {
-        'total_users': total_users,
-        'total_products': total_products,
-        'total_preferences': total_preferences,
-        'users_with_preferences': total_preferences,  # Same as total_preferences
-        'new_users_today': new_users_today,
-        'active_products': total_products,  # Same as total_products
-        'total_recommendations': total_recommendations,
-        'recommendations_today': recommendations_today
+        'total_users': counters['total_users'],
+        'total_products': counters['total_products'],
+        'total_preferences': counters['total_preferences'],
+        'users_with_preferences': counters['total_preferences'],  # One preference row per user
+        'new_users_today': counters['new_users_today'],
+        'active_products': counters['total_products'],  # Same as total_products
+        'total_recommendations': counters['total_recommendations'],
+        'recommendations_today': counters['recommendations_today']
     }
     
     return render_template('admin/dashboard.html', stats=stats)
@@ -302,12 +300,21 @@ def admin_products():
     
     page = request.args.get('page', 1, type=int)
     per_page = 20
-    search = request.args.get('search', '')
+    search = request.args.get('search', '').strip()
     brand = request.args.get('brand', '')
-    sort = request.args.get('sort', 'rating')
+    sort = request.args.get('sort') or ('relevance' if search else 'rating')
     
-    products = Product.get_paginated_with_filters(page, per_page, search, brand, sort)
-    return render_template('admin/products.html', products=products)
+    # Text search runs on the in-memory product index; the page's rows come from the database
+    found = recommender.search_products(search, page, per_page, sort, brand) if search else None
+    if found is not None:
+        products = Product.get_page_by_ids(found['ids'], found['total'], found['page'], per_page)
+    else:
+        products = Product.get_paginated_with_filters(page, per_page, search, brand, sort,
+                                                      cursor=request.args.get('cursor'))
+    
+    # Filters carried by the pagination links (page and cursor are set per link)
+    page_args = {key: request.args[key] for key in PRODUCT_PAGE_ARGS if request.args.get(key)}
+    return render_template('admin/products.html', products=products, page_args=page_args)
 
 @app.route('/admin/product/create', methods=['GET', 'POST'])
 def admin_create_product():
@@ -424,5 +431,13 @@ def not_found(error):
 def internal_error(error):
     return render_template('500.html'), 500
 
+@app.errorhandler(PoolExhaustedError)
+def database_busy(error):
+    """Every pooled connection is busy: ask the client to retry instead of showing empty results"""
+    print(error)
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Server sedang sibuk. Silakan coba lagi.'}), 503, {'Retry-After': '1'}
+    return 'Server sedang sibuk. Silakan coba lagi.', 503, {'Retry-After': '1'}
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
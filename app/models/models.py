@@ -1,7 +1,11 @@
 from werkzeug.security import generate_password_hash, check_password_hash
-from app.config.config import DatabaseConfig
+from app.config.config import Config, DatabaseConfig
+from app.utils.cache import LRUCache
+from app.utils.stats import dashboard_stats
 from datetime import datetime
 import re
+import json
+import base64
 
 class User:
     """User model for handling user operations"""
@@ -76,6 +80,7 @@ class User:
         result = DatabaseConfig.execute_query(query, params)
         
         if result:
+            dashboard_stats.record_signup()
             return {'success': True, 'user_id': result}
         else:
             return {'success': False, 'errors': ['Terjadi kesalahan saat menyimpan data']}
@@ -160,6 +165,37 @@ class Admin:
 class Product:
     """Product model for handling product operations"""
     
+    # Callbacks invoked as listener(action, product_id) after catalog writes
+    _change_listeners = []
+    
+    # Product totals per brand, dropped on every product write
+    _aggregate_cache = LRUCache(1, Config.PRODUCT_AGGREGATE_TTL)
+    
+    # Admin listing sort -> (column, selected alias, direction); id breaks ties in the same direction
+    LISTING_SORTS = {
+        'rating': ('rating_bintang', 'rating', 'DESC'),
+        'name': ('nama_produk', 'name', 'ASC'),
+        'price_low': ('harga', 'price', 'ASC'),
+        'price_high': ('harga', 'price', 'DESC')
+    }
+    
+    @staticmethod
+    def add_change_listener(listener):
+        """Register a callback notified after product create/update/delete"""
+        Product._change_listeners.append(listener)
+    
+    @staticmethod
+    def _notify_change(action, product_id=None):
+        """Notify registered listeners that the catalog changed"""
+        Product._aggregate_cache.clear()
+        if action in ('create', 'delete'):
+            dashboard_stats.increment('total_products', 1 if action == 'create' else -1)
+        for listener in list(Product._change_listeners):
+            try:
+                listener(action, product_id)
+            except Exception as e:
+                print(f"Product change listener error: {e}")
+    
     @staticmethod
     def create(name, brand, category, price, description, ingredients=None, skin_type=None, rating=0.0, image_url=None):
         """Create new product"""
@@ -167,8 +203,10 @@ class Product:
             INSERT INTO products (nama_produk, brand, harga, deskripsi_produk, rating_bintang)
             VALUES (%s, %s, %s, %s, %s)
         """
-        result = DatabaseConfig.execute_query(query, (name, brand, price, description, rating))
-        return result > 0 if result else False
+        product_id = DatabaseConfig.execute_insert(query, (name, brand, price, description, rating))
+        if product_id:
+            Product._notify_change('create', product_id)
+        return product_id > 0 if product_id else False
     
     @staticmethod
     def get_by_id(product_id):
@@ -177,7 +215,7 @@ class Product:
             SELECT id, nama_produk as name, brand, 'skincare' as category, harga as price, 
                    deskripsi_produk as description, '' as ingredients, '' as skin_type, 
                    rating_bintang as rating, '' as image_url,
-                   created_at, updated_at, link_produk, marketplace
+                   created_at, updated_at, link_produk, marketplace, terjual, reviews
             FROM products WHERE id = %s
         """
         result = DatabaseConfig.execute_query(query, (product_id,), fetch=True)
@@ -190,15 +228,23 @@ class Product:
             SELECT id, nama_produk as name, brand, 'skincare' as category, harga as price, 
                    deskripsi_produk as description, '' as ingredients, '' as skin_type, 
                    rating_bintang as rating, '' as image_url,
-                   created_at, updated_at, link_produk, marketplace
+                   created_at, updated_at, link_produk, marketplace, terjual, reviews
             FROM products ORDER BY rating_bintang DESC
         """
         return DatabaseConfig.execute_query(query, fetch=True) or []
     
     @staticmethod
-    def get_paginated_with_filters(page=1, per_page=20, search='', brand='', sort='rating'):
-        """Get paginated products with search and filter functionality"""
-        offset = (page - 1) * per_page
+    def get_paginated_with_filters(page=1, per_page=20, search='', brand='', sort='rating', cursor=None):
+        """Get paginated products with search and filter functionality
+        
+        Pages are read by keyset (seek) pagination on (sort column, id):
+        cursor continues from the neighbouring page and the first and last
+        pages seek from either end, so only direct jumps to a middle page
+        use OFFSET. Totals come from the cached per-brand aggregates.
+        """
+        if sort not in Product.LISTING_SORTS:
+            sort = 'rating'
+        column, alias, direction = Product.LISTING_SORTS[sort]
         
         # Build WHERE clause
         where_conditions = []
@@ -212,19 +258,67 @@ class Product:
             where_conditions.append("brand = %s")
             params.append(brand)
         
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        def count_products():
+            """(matching products, distinct brands)"""
+            if search:
+                # LIKE filters cannot be pre-aggregated
+                where_clause = "WHERE " + " AND ".join(where_conditions)
+                count_query = f"SELECT COUNT(*) as total FROM products {where_clause}"
+                count_result = DatabaseConfig.execute_query(count_query, params, fetch=True)
+                return (count_result[0]['total'] if count_result else 0), Product.count_brands()
+            aggregates = Product.get_aggregates()
+            total = aggregates['brands'].get(Product._brand_key(brand), 0) if brand else aggregates['total']
+            return total, len(aggregates['brands'])
         
-        # Build ORDER BY clause
-        order_by = "ORDER BY "
-        if sort == 'name':
-            order_by += "nama_produk ASC"
-        elif sort == 'price_low':
-            order_by += "harga ASC"
-        elif sort == 'price_high':
-            order_by += "harga DESC"
-        else:  # default to rating
-            order_by += "rating_bintang DESC"
+        seek = Product._decode_cursor(cursor, sort)
+        if seek is not None or page <= 1:
+            # Seek past the cursor row (or from the start): the rows do not depend on the totals
+            towards, value, product_id = seek or ('after', None, None)
+            (total, total_brands), products = DatabaseConfig.gather(
+                count_products,
+                lambda: Product._get_listing_rows(column, direction, where_conditions, params,
+                                                  per_page, reverse=towards == 'before',
+                                                  after=None if seek is None else (value, product_id))
+            )
+        else:
+            # Page jump: the last page seeks from the far end, others fall back to OFFSET
+            total, total_brands = count_products()
+            pages = (total + per_page - 1) // per_page
+            if pages > 1 and page >= pages:
+                products = Product._get_listing_rows(column, direction, where_conditions, params,
+                                                     total - (pages - 1) * per_page, reverse=True)
+            else:
+                products = Product._get_listing_rows(column, direction, where_conditions, params,
+                                                     per_page, offset=(page - 1) * per_page)
+        pages = (total + per_page - 1) // per_page
         
+        return {
+            'products': products,
+            'total': total,
+            'total_brands': total_brands,
+            'page': page,
+            'per_page': per_page,
+            'pages': pages,
+            'prev_cursor': Product._encode_cursor(sort, 'before', products[0], alias) if products else None,
+            'next_cursor': Product._encode_cursor(sort, 'after', products[-1], alias) if products else None
+        }
+    
+    @staticmethod
+    def _get_listing_rows(column, direction, where_conditions, params, limit, offset=0, reverse=False, after=None):
+        """Read listing rows ordered by (column, id), optionally seeking past after=(value, id)
+        
+        reverse reads backwards from the far end (or from after), and the rows
+        are returned in listing order.
+        """
+        where_conditions = list(where_conditions)
+        params = list(params)
+        if after is not None:
+            comparison = '>' if (direction == 'ASC') != reverse else '<'
+            where_conditions.append(f"({column}, id) {comparison} (%s, %s)")
+            params.extend(after)
+        
+        order = direction if not reverse else ('ASC' if direction == 'DESC' else 'DESC')
+        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
         query = f"""
             SELECT id, nama_produk as name, brand, 'skincare' as category, harga as price, 
                    deskripsi_produk as description, '' as ingredients, '' as skin_type, 
@@ -232,33 +326,54 @@ class Product:
                    created_at, updated_at
             FROM products 
             {where_clause}
-            {order_by}
+            ORDER BY {column} {order}, id {order}
             LIMIT %s OFFSET %s
         """
         
-        params.extend([per_page, offset])
+        params.extend([limit, offset])
         products = DatabaseConfig.execute_query(query, params, fetch=True) or []
-        
-        # Get total count with same filters
-        count_query = f"SELECT COUNT(*) as total FROM products {where_clause}"
-        count_params = params[:-2]  # Remove LIMIT and OFFSET params
-        count_result = DatabaseConfig.execute_query(count_query, count_params, fetch=True)
-        total = count_result[0]['total'] if count_result else 0
-        
-        # Get total unique brands count (without filters for accurate brand count)
-        brand_count_query = "SELECT COUNT(DISTINCT brand) as brand_count FROM products"
-        brand_count_result = DatabaseConfig.execute_query(brand_count_query, fetch=True)
-        total_brands = brand_count_result[0]['brand_count'] if brand_count_result else 0
-        
-        return {
-            'products': products,
-            'total': total,
-            'total_brands': total_brands,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        }
-
+        if reverse:
+            products.reverse()
+        return products
+    
+    @staticmethod
+    def _encode_cursor(sort, towards, product, alias):
+        """Opaque URL-safe cursor for seeking before/after a listed product"""
+        payload = json.dumps([sort, towards, product[alias], product['id']], default=str)
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor, sort):
+        """(towards, sort value, id) of a cursor for this sort, or None if absent or invalid"""
+        if not cursor:
+            return None
+        try:
+            cursor_sort, towards, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError):
+            return None
+        if cursor_sort != sort or towards not in ('before', 'after'):
+            return None
+        return towards, value, int(product_id)
+    
+    @staticmethod
+    def get_aggregates():
+        """Get product totals overall and per brand, cached until the next product write"""
+        aggregates = Product._aggregate_cache.get('products')
+        if aggregates is None:
+            query = "SELECT brand, COUNT(*) as total FROM products GROUP BY brand"
+            brands = {}
+            for row in DatabaseConfig.execute_query(query, fetch=True) or []:
+                key = Product._brand_key(row['brand'])
+                brands[key] = brands.get(key, 0) + row['total']
+            aggregates = {'total': sum(brands.values()), 'brands': brands}
+            Product._aggregate_cache.set('products', aggregates)
+        return aggregates
+    
+    @staticmethod
+    def _brand_key(brand):
+        """Brand as compared by the case-insensitive, trailing-space-insensitive collation"""
+        return (brand or '').rstrip().lower()
+    
     @staticmethod
     def get_paginated(page=1, per_page=20):
         """Get paginated products"""
@@ -300,6 +415,8 @@ class Product:
             data.get('name'), data.get('brand'), data.get('price'), 
             data.get('description'), data.get('rating'), product_id
         ))
+        if result:
+            Product._notify_change('update', product_id)
         return result > 0 if result else False
     
     @staticmethod
@@ -307,6 +424,8 @@ class Product:
         """Delete product"""
         query = "DELETE FROM products WHERE id = %s"
         result = DatabaseConfig.execute_query(query, (product_id,))
+        if result:
+            Product._notify_change('delete', product_id)
         return result > 0 if result else False
     
     @staticmethod
@@ -316,6 +435,64 @@ class Product:
         result = DatabaseConfig.execute_query(query, fetch=True)
         return result[0]['total'] if result else 0
     
+    @staticmethod
+    def get_catalog_state():
+        """Get product count and latest modification time"""
+        query = "SELECT COUNT(*) as total, MAX(updated_at) as last_updated FROM products"
+        result = DatabaseConfig.execute_query(query, fetch=True)
+        return result[0] if result else None
+    
+    @staticmethod
+    def get_page_by_ids(product_ids, total, page=1, per_page=20):
+        """Get one page of products by id (in the given order), shaped like get_paginated_with_filters"""
+        products = []
+        if product_ids:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            query = f"""
+                SELECT id, nama_produk as name, brand, 'skincare' as category, harga as price, 
+                       deskripsi_produk as description, '' as ingredients, '' as skin_type, 
+                       rating_bintang as rating, '' as image_url,
+                       created_at, updated_at
+                FROM products WHERE id IN ({placeholders})
+            """
+            rows = DatabaseConfig.execute_query(query, list(product_ids), fetch=True) or []
+            by_id = {row['id']: row for row in rows}
+            products = [by_id[product_id] for product_id in product_ids if product_id in by_id]
+        
+        return {
+            'products': products,
+            'total': total,
+            'total_brands': Product.count_brands(),
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page,
+            'prev_cursor': None,  # Ranked search pages are addressed by page number
+            'next_cursor': None
+        }
+    
+    @staticmethod
+    def count_brands():
+        """Count distinct product brands"""
+        return len(Product.get_aggregates()['brands'])
+    
+    @staticmethod
+    def get_changed_since(since):
+        """Get products created or modified at or after since (an updated_at watermark)"""
+        query = """
+            SELECT id, nama_produk as name, brand, 'skincare' as category, harga as price, 
+                   deskripsi_produk as description, '' as ingredients, '' as skin_type, 
+                   rating_bintang as rating, '' as image_url,
+                   created_at, updated_at, link_produk, marketplace, terjual, reviews
+            FROM products WHERE updated_at >= %s ORDER BY updated_at
+        """
+        return DatabaseConfig.execute_query(query, (since,), fetch=True) or []
+    
+    @staticmethod
+    def get_all_ids():
+        """Get the ids of all products"""
+        result = DatabaseConfig.execute_query("SELECT id FROM products", fetch=True) or []
+        return [row['id'] for row in result]
+    
     @staticmethod
     def search_by_price_range(min_price, max_price):
         """Search products by price range"""
@@ -406,6 +583,8 @@ class UserPreference:
             )
         
         result = DatabaseConfig.execute_query(query, params)
+        if result and not existing:
+            dashboard_stats.increment('total_preferences')
         return result > 0 if result else False
     
     @staticmethod
@@ -426,9 +605,81 @@ class UserPreference:
         """
         return DatabaseConfig.execute_query(query, fetch=True) or []
     
+    @staticmethod
+    def iter_all(batch_size=500):
+        """Iterate over all user preferences in id order, one page at a time"""
+        query = """
+            SELECT up.*, u.username, u.nama_lengkap as full_name 
+            FROM user_preferences up 
+            JOIN users u ON up.user_id = u.id 
+            WHERE up.id > %s
+            ORDER BY up.id 
+            LIMIT %s
+        """
+        last_id = 0
+        while True:
+            rows = DatabaseConfig.execute_query(query, (last_id, batch_size), fetch=True) or []
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]['id']
+    
     @staticmethod
     def count():
         """Count total user preferences"""
         query = "SELECT COUNT(*) as total FROM user_preferences"
         result = DatabaseConfig.execute_query(query, fetch=True)
-        return result[0]['total'] if result else 0
\ No newline at end of file
+        return result[0]['total'] if result else 0
+
+
+class PrecomputedRecommendation:
+    """Precomputed top-N products for keyword-free preference profiles"""
+    
+    @staticmethod
+    def get(kondisi_kulit, masalah_kulit, preferensi_produk, rentang_harga):
+        """Get the stored ranking for one preference profile"""
+        query = """
+            SELECT product_ids, scores, catalog_signature
+            FROM precomputed_recommendations
+            WHERE kondisi_kulit = %s AND masalah_kulit = %s 
+              AND preferensi_produk = %s AND rentang_harga = %s
+        """
+        result = DatabaseConfig.execute_query(
+            query, (kondisi_kulit, masalah_kulit, preferensi_produk, rentang_harga), fetch=True
+        )
+        return result[0] if result else None
+    
+    @staticmethod
+    def save_many(rows, catalog_signature, batch_size=200):
+        """Insert or replace rankings for many profiles in batches"""
+        query = """
+            INSERT INTO precomputed_recommendations 
+            (kondisi_kulit, masalah_kulit, preferensi_produk, rentang_harga, 
+             catalog_signature, product_ids, scores)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE 
+                catalog_signature = VALUES(catalog_signature),
+                product_ids = VALUES(product_ids),
+                scores = VALUES(scores)
+        """
+        data = [
+            (
+                row['kondisi_kulit'], row['masalah_kulit'], row['preferensi_produk'], row['rentang_harga'],
+                catalog_signature,
+                ','.join(str(pid) for pid in row['product_ids']),
+                ','.join(repr(score) for score in row['scores'])
+            )
+            for row in rows
+        ]
+        for start in range(0, len(data), batch_size):
+            if not DatabaseConfig.execute_many(query, data[start:start + batch_size]):
+                return False
+        return True
+    
+    @staticmethod
+    def count():
+        """Count stored profiles"""
+        query = "SELECT COUNT(*) as total FROM precomputed_recommendations"
+        result = DatabaseConfig.execute_query(query, fetch=True)
+        return result[0]['total'] if result else 0
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        """Get a cached value, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries"""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class CleanedTextCache:
+    """On-disk map of product content hash -> cleaned product text
+
+    Stored in one .npz file (sorted uint64 keys, the UTF-8 texts back to
+    back and the byte offset where each one starts) and replaced atomically.
+    A missing, unreadable or unwritable file only costs cache misses.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def lookup(self, keys):
+        """Return a list with the cached text for each key, or None on miss"""
+        try:
+            with np.load(self.path) as stored:
+                cached_keys = stored['keys']
+                blob = stored['text'].tobytes()
+                offsets = stored['offsets']
+
+            result = [None] * len(keys)
+            if not len(cached_keys):
+                return result
+            found = np.minimum(np.searchsorted(cached_keys, keys), len(cached_keys) - 1)
+            for row in np.flatnonzero(cached_keys[found] == keys):
+                position = found[row]
+                result[row] = blob[offsets[position]:offsets[position + 1]].decode('utf-8')
+            return result
+        except FileNotFoundError:
+            return [None] * len(keys)
+        except Exception as e:
+            # Truncated or foreign file (zipfile.BadZipFile, EOFError, ...): treat as empty
+            print(f"Ignoring unreadable cleaned text cache {self.path}: {e}")
+            return [None] * len(keys)
+
+    def save(self, keys, texts):
+        """Replace the cache with the given keys and texts; returns False if it could not be written"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        keys, first = np.unique(keys, return_index=True)
+        encoded = [texts[row].encode('utf-8') for row in first]
+        blob = b''.join(encoded)
+        offsets = np.concatenate(([0], np.cumsum([len(text) for text in encoded], dtype=np.int64)))
+
+        directory = os.path.dirname(self.path) or '.'
+        temporary = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Unique per writer: several worker processes may rebuild at once
+            handle, temporary = tempfile.mkstemp(
+                dir=directory, prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, keys=keys, text=np.frombuffer(blob, dtype=np.uint8), offsets=offsets)
+            os.replace(temporary, self.path)
+            return True
+        except Exception as e:
+            print(f"Could not write cleaned text cache {self.path}: {e}")
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+            return False
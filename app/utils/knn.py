@@ -0,0 +1,395 @@
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+class KNNIndex:
+    """Exact cosine k-nearest-neighbour index over L2-normalized sparse rows
+
+    Rows are grouped into fixed-size blocks of products sharing their
+    dominant term, and every block keeps the maximum weight of each term.
+    The dot product of a query with those maxima bounds the similarity of
+    every product in the block, so blocks are visited best bound first and
+    the search stops once no remaining block can beat the current k-th
+    neighbour. Results match a full scan, ties broken by catalog order.
+    Only the block order and maxima are stored; rows are scored straight
+    from the caller's matrix, which may be a read-only memory map.
+    """
+
+    FILES = ('knn_order', 'knn_max_data', 'knn_max_indices', 'knn_max_indptr')
+    BLOCKS_PER_STEP = 16
+    EPSILON = 1e-9  # Slack for float rounding between bounds and exact scores
+
+    def __init__(self, matrix, order, block_max, block_size=64):
+        self.matrix = matrix
+        self.order = order
+        self.block_max = block_max
+        self.block_size = block_size
+        self.n_blocks = block_max.shape[0]
+        self.stats = {'queries': 0, 'rows_scored': 0}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, matrix, block_size=64):
+        """Group the rows of matrix into blocks and compute their term maxima"""
+        matrix = sparse.csr_matrix(matrix)
+        n_rows, n_features = matrix.shape
+        block_size = max(1, int(block_size))
+        n_blocks = -(-n_rows // block_size)
+
+        # Order rows by dominant term (then weight) so similar products share blocks.
+        # Computed from the raw arrays: the matrix may be a read-only memory map.
+        lengths = np.diff(matrix.indptr)
+        row_ids = np.repeat(np.arange(n_rows), lengths)
+        by_weight = np.lexsort((matrix.indices, -matrix.data, row_ids))
+        filled = np.flatnonzero(lengths)
+        heaviest = by_weight[matrix.indptr[filled]]
+        dominant = np.zeros(n_rows, dtype=np.int64)
+        weight = np.zeros(n_rows)
+        dominant[filled] = matrix.indices[heaviest]
+        weight[filled] = matrix.data[heaviest]
+        order = np.lexsort((np.arange(n_rows), -weight, dominant))
+
+        # Per-block maximum of every term, as CSC for slicing by query terms
+        block_of = np.empty(n_rows, dtype=np.int64)
+        block_of[order] = np.arange(n_rows) // block_size
+        keys = block_of[row_ids] * n_features + matrix.indices
+        sort = np.argsort(keys, kind='stable')
+        keys, data = keys[sort], matrix.data[sort]
+        if len(keys):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            maxima, keys = np.maximum.reduceat(data, starts), keys[starts]
+        else:
+            maxima = data
+        block_max = sparse.csc_matrix(
+            (maxima, (keys // n_features, keys % n_features)), shape=(n_blocks, n_features)
+        )
+        return cls(matrix, order, block_max, block_size)
+
+    def save(self, directory):
+        """Write the index arrays (the product matrix is stored by the caller)"""
+        arrays = (self.order, self.block_max.data, self.block_max.indices, self.block_max.indptr)
+        for name, array in zip(self.FILES, arrays):
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    @classmethod
+    def load(cls, directory, matrix, block_size=64):
+        """Open a saved index over matrix with memory-mapped arrays"""
+        order, data, indices, indptr = [
+            np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in cls.FILES]
+        n_blocks = -(-matrix.shape[0] // block_size)
+        block_max = sparse.csc_matrix((data, indices, indptr), shape=(n_blocks, matrix.shape[1]), copy=False)
+        return cls(matrix, order, block_max, block_size)
+
+    def search(self, query, n, mask=None, exclude=None):
+        """Return (positions, similarities) of the n nearest rows to one query row
+
+        mask is an optional boolean array over catalog positions and exclude an
+        optional sorted array of positions; rows outside mask or in exclude are
+        never returned.
+        """
+        query = sparse.csr_matrix(query)
+        n_rows = len(self)
+        if n <= 0 or n_rows == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        bounds = np.asarray(self.block_max[:, query.indices] @ query.data).ravel()
+        block_order = np.argsort(-bounds, kind='stable')
+        query_column = query.T.tocsc()
+
+        best_positions = np.empty(0, dtype=np.intp)
+        best_similarities = np.empty(0)
+        offsets = np.arange(self.block_size)
+        step = 0
+        rows_scored = 0
+        while step < self.n_blocks:
+            blocks = block_order[step:step + self.BLOCKS_PER_STEP]
+            top_bound = bounds[blocks[0]]
+            # Blocks sharing no query term only hold zero similarities (filled below)
+            if top_bound <= 0:
+                break
+            if len(best_positions) >= n and top_bound + self.EPSILON < best_similarities[-1]:
+                break
+
+            rows = (blocks[:, None] * self.block_size + offsets).ravel()
+            positions = self.order[rows[rows < n_rows]]
+            if mask is not None or exclude is not None:
+                positions = positions[self._eligible(positions, mask, exclude)]
+
+            if len(positions):
+                similarities = (self.matrix[positions] @ query_column).toarray().ravel()
+                best_positions, best_similarities = self._merge(
+                    best_positions, best_similarities, positions, similarities, n)
+                rows_scored += len(positions)
+            step += len(blocks)
+
+        # Every unvisited product has similarity 0; take the earliest in catalog order
+        if step < self.n_blocks and (len(best_positions) < n or best_similarities[-1] <= 0):
+            rest = (block_order[step:, None] * self.block_size + offsets).ravel()
+            rest = self.order[rest[rest < n_rows]]
+            if mask is not None or exclude is not None:
+                rest = rest[self._eligible(rest, mask, exclude)]
+            if len(rest) > n:
+                rest = np.partition(rest, n - 1)[:n]
+            best_positions, best_similarities = self._merge(
+                best_positions, best_similarities, rest, np.zeros(len(rest)), n)
+
+        self.stats['queries'] += 1
+        self.stats['rows_scored'] += rows_scored
+        return best_positions, best_similarities
+
+    @staticmethod
+    def _eligible(positions, mask, exclude):
+        """Boolean array of positions inside mask and not in exclude"""
+        keep = mask[positions] if mask is not None else np.ones(len(positions), dtype=bool)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(positions, exclude, assume_unique=False)
+        return keep
+
+    @staticmethod
+    def _merge(positions, similarities, new_positions, new_similarities, n):
+        """Keep the n best of two candidate lists, ties broken by position"""
+        positions = np.concatenate((positions, new_positions))
+        similarities = np.concatenate((similarities, new_similarities))
+        order = np.lexsort((positions, -similarities))[:n]
+        return positions[order], similarities[order]
+
+
+class InvertedIndex:
+    """Exact cosine nearest-neighbour search over per-term postings lists
+
+    Only products sharing a query term are scored. Terms are processed in
+    decreasing order of their upper bound (query weight x largest posting
+    weight). MaxScore-style: once the n-th best partial score exceeds what
+    the remaining terms could add, those terms only update the existing
+    candidates (binary search into their postings), and candidates that can
+    no longer reach the threshold are dropped. Cost depends on posting
+    lengths, not catalog size. The accumulated scores only preselect the
+    top n; those are re-scored against the rows in float32, like the full
+    scan, so similarities and tie order match it.
+    """
+
+    EPSILON = 1e-6  # Slack for float32 rounding of the exact scores
+
+    def __init__(self, matrix):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.postings = sparse.csc_matrix(matrix, copy=True)
+        self.postings.sort_indices()
+        indptr = self.postings.indptr
+        filled = np.flatnonzero(np.diff(indptr))
+        self.max_weight = np.zeros(self.postings.shape[1])
+        if len(filled):
+            self.max_weight[filled] = np.maximum.reduceat(self.postings.data, indptr[filled])
+        self.stats = {'queries': 0, 'postings_scanned': 0}
+
+    def __len__(self):
+        return self.postings.shape[0]
+
+    def search(self, query, n, mask=None, exclude=None):
+        """Return (positions, similarities) of the n nearest rows to one query row"""
+        query = sparse.csr_matrix(query)
+        if n <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        terms, weights = query.indices, query.data
+        bounds = weights * self.max_weight[terms]
+        by_bound = np.argsort(-bounds, kind='stable')
+        terms, weights, bounds = terms[by_bound], weights[by_bound], bounds[by_bound]
+        remaining = np.cumsum(bounds[::-1])[::-1]  # Bound of term i and every later term
+
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        docs = np.empty(0, dtype=np.intp)
+        scores = np.empty(0)
+        scanned = 0
+        for i, (term, weight) in enumerate(zip(terms, weights)):
+            start, end = indptr[term], indptr[term + 1]
+            threshold = np.partition(scores, len(scores) - n)[len(scores) - n] if len(scores) >= n else -np.inf
+
+            if remaining[i] + self.EPSILON < threshold:
+                # No unseen product can reach the top n: only update known candidates
+                found = np.searchsorted(indices[start:end], docs)
+                hit = found < end - start
+                hit[hit] = indices[start + found[hit]] == docs[hit]
+                scores[hit] += weight * data[start + found[hit]]
+                scanned += len(docs)
+
+                later = remaining[i + 1] if i + 1 < len(remaining) else 0.0
+                keep = scores + later + self.EPSILON >= threshold
+                docs, scores = docs[keep], scores[keep]
+                continue
+
+            # Merge the whole posting list into the candidates
+            term_docs = indices[start:end]
+            term_scores = weight * data[start:end]
+            if mask is not None or exclude is not None:
+                keep = KNNIndex._eligible(term_docs, mask, exclude)
+                term_docs, term_scores = term_docs[keep], term_scores[keep]
+            docs, inverse = np.unique(np.concatenate((docs, term_docs)), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate((scores, term_scores)), minlength=len(docs))
+            scanned += end - start
+
+        # Re-score every candidate that may tie with the n-th best exactly as the full scan does
+        front = docs
+        if len(docs) > n:
+            cutoff = np.partition(scores, len(scores) - n)[len(scores) - n]
+            front = docs[scores + self.EPSILON >= cutoff]
+        similarities = (self.matrix[front] @ query.T).toarray().ravel() if len(front) else np.empty(0, np.float32)
+        best_positions, best_similarities = KNNIndex._merge(
+            np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), front, similarities, n)
+
+        # Products sharing no query term have similarity 0; take the earliest in catalog order
+        if len(best_positions) < n or best_similarities[-1] <= 0:
+            unseen = np.ones(len(self), dtype=bool)
+            unseen[docs] = False
+            if mask is not None:
+                unseen &= mask[:len(self)]
+            rest = np.flatnonzero(unseen)
+            if exclude is not None and len(exclude):
+                rest = rest[~np.isin(rest, exclude)]
+            best_positions, best_similarities = KNNIndex._merge(
+                best_positions, best_similarities, rest[:n], np.zeros(min(n, len(rest)), dtype=np.float32), n)
+
+        self.stats['queries'] += 1
+        self.stats['postings_scanned'] += scanned
+        return best_positions, best_similarities
+
+
+class IVFIndex:
+    """Approximate cosine nearest-neighbour index (inverted file over k-means lists)
+
+    Products are clustered with spherical k-means into n_lists lists. A query
+    scores the list centroids, then only the products of the n_probe closest
+    lists. More probes raise recall at the cost of latency; results are exact
+    once n_probe covers every list.
+    """
+
+    FILES = ('ivf_centroids', 'ivf_order', 'ivf_offsets')
+
+    def __init__(self, matrix, centroids, order, offsets, n_probe=8):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.n_probe = n_probe
+        self.stats = {'queries': 0, 'rows_scored': 0}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix, n_lists=0, n_probe=8, iterations=5, sample_size=20000,
+              max_cells=16 * 1024 * 1024, seed=42):
+        """Cluster the rows of matrix and return the index (n_lists=0 picks sqrt(rows))"""
+        matrix = sparse.csr_matrix(matrix)
+        n_rows = matrix.shape[0]
+        n_lists = n_lists or int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        # Spherical k-means on a sample of the rows
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n_rows, min(n_rows, max(sample_size, n_lists)), replace=False))
+        training = matrix[sample]
+        centroids = training[rng.choice(training.shape[0], n_lists, replace=False)].toarray()
+        for _ in range(iterations):
+            assignment = cls._assign(training, centroids, max_cells)
+            membership = sparse.csr_matrix(
+                (np.ones(len(assignment)), (assignment, np.arange(len(assignment)))),
+                shape=(n_lists, training.shape[0])
+            )
+            sums = np.asarray((membership @ training).todense())
+            norms = np.linalg.norm(sums, axis=1)
+            filled = norms > 0  # Empty lists keep their previous centroid
+            centroids[filled] = sums[filled] / norms[filled, None]
+        centroids = centroids.astype(np.float32)
+
+        # Assign every row and store the lists contiguously
+        assignment = cls._assign(matrix, centroids, max_cells)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        return cls(matrix, centroids, order, offsets, n_probe)
+
+    @staticmethod
+    def _assign(matrix, centroids, max_cells):
+        """Nearest centroid of every row, in chunks of at most max_cells scores"""
+        chunk = max(1, max_cells // max(len(centroids), 1))
+        assignment = np.empty(matrix.shape[0], dtype=np.intp)
+        for start in range(0, matrix.shape[0], chunk):
+            scores = matrix[start:start + chunk] @ centroids.T
+            assignment[start:start + chunk] = np.asarray(scores).argmax(axis=1)
+        return assignment
+
+    def save(self, directory):
+        """Write the index arrays (the product matrix is stored by the caller)"""
+        for name, array in zip(self.FILES, (self.centroids, self.order, self.offsets)):
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+
+    @classmethod
+    def load(cls, directory, matrix, n_probe=8):
+        """Open a saved index over matrix with memory-mapped arrays"""
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in cls.FILES]
+        return cls(matrix, *arrays, n_probe=n_probe)
+
+    def search(self, query, n, mask=None, exclude=None, n_probe=None):
+        """Return (positions, similarities) of about the n nearest rows to one query row
+
+        Lists are probed closest first; more lists are probed while fewer than
+        n eligible rows have been seen.
+        """
+        query = sparse.csr_matrix(query)
+        if n <= 0 or len(self) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        centroid_scores = self.centroids[:, query.indices] @ query.data
+        list_order = np.argsort(-centroid_scores, kind='stable')
+        n_probe = max(1, n_probe or self.n_probe)
+        query_column = query.T.tocsc()
+
+        best_positions = np.empty(0, dtype=np.intp)
+        best_similarities = np.empty(0)
+        rows_scored = 0
+        step = 0
+        while step < self.n_lists and (step == 0 or len(best_positions) < n):
+            lists = list_order[step:step + n_probe]
+            positions = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+            if mask is not None or exclude is not None:
+                positions = positions[KNNIndex._eligible(positions, mask, exclude)]
+            if len(positions):
+                similarities = (self.matrix[positions] @ query_column).toarray().ravel()
+                best_positions, best_similarities = KNNIndex._merge(
+                    best_positions, best_similarities, positions, similarities, n)
+                rows_scored += len(positions)
+            step += len(lists)
+
+        self.stats['queries'] += 1
+        self.stats['rows_scored'] += rows_scored
+        return best_positions, best_similarities
+
+
+def measure_recall(index, exact_index, queries, n, **search_options):
+    """Mean recall@n of index against exact_index and the mean latency of both (ms)"""
+    recalls = []
+    timings = {'index': 0.0, 'exact': 0.0}
+    for row in range(queries.shape[0]):
+        query = queries[row]
+        start = time.perf_counter()
+        approximate, _ = index.search(query, n, **search_options)
+        timings['index'] += time.perf_counter() - start
+        start = time.perf_counter()
+        exact, _ = exact_index.search(query, n)
+        timings['exact'] += time.perf_counter() - start
+        if len(exact):
+            recalls.append(len(np.intersect1d(approximate, exact)) / len(exact))
+
+    count = max(queries.shape[0], 1)
+    return {
+        'recall': float(np.mean(recalls)) if recalls else 1.0,
+        'index_ms': timings['index'] / count * 1000,
+        'exact_ms': timings['exact'] / count * 1000
+    }
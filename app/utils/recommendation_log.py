@@ -0,0 +1,129 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from app.config.config import Config, DatabaseConfig, PoolExhaustedError
+
+class RecommendationLog:
+    """Buffered writer of served recommendations into the recommendations table
+    
+    record() only puts rows on a bounded in-process queue; a background
+    thread drains it and inserts with DatabaseConfig.execute_many once a
+    batch is full or RECOMMENDATION_LOG_FLUSH_INTERVAL seconds have passed.
+    When the queue is full, record() waits up to
+    RECOMMENDATION_LOG_PUT_TIMEOUT seconds and then drops the rows, so a
+    slow database never holds up a request for long. Pending rows are
+    flushed at interpreter exit.
+    """
+    
+    INSERT_QUERY = """
+        INSERT IGNORE INTO recommendations (user_id, product_id, score, reason)
+        VALUES (%s, %s, %s, %s)
+    """
+    _STOP = object()
+    
+    def __init__(self, max_queued=None, batch_size=None, flush_interval=None, put_timeout=None):
+        self.max_queued = Config.RECOMMENDATION_LOG_QUEUE_SIZE if max_queued is None else max_queued
+        self.batch_size = Config.RECOMMENDATION_LOG_BATCH_SIZE if batch_size is None else batch_size
+        self.flush_interval = Config.RECOMMENDATION_LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.put_timeout = Config.RECOMMENDATION_LOG_PUT_TIMEOUT if put_timeout is None else put_timeout
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+    
+    def record(self, user_id, recommendations):
+        """Queue the served recommendations of one user, dropping them if the queue stays full"""
+        if not recommendations or self.max_queued <= 0:
+            return False
+        
+        rows = [
+            (user_id, int(rec['product']['id']), round(float(rec['content_similarity']), 3), rec.get('explanation'))
+            for rec in recommendations
+        ]
+        pending = self._get_queue()
+        try:
+            pending.put(rows, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += len(rows)
+            return False
+        
+        with self._lock:
+            self._stats['recorded'] += len(rows)
+        return True
+    
+    def close(self, timeout=None):
+        """Flush pending rows and stop the worker thread"""
+        with self._lock:
+            worker = self._worker if self._pid == os.getpid() else None
+            self._worker = None
+        if worker is None:
+            return
+        
+        # Block rather than drop: the stop marker must be seen after every queued row
+        self._queue.put(self._STOP)
+        worker.join(timeout)
+    
+    def stats(self):
+        """Get writer metrics (rows recorded, written, dropped, failed; batches; queued events)"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+    
+    def _get_queue(self):
+        """Get the queue, starting the worker on first use (again after fork)"""
+        with self._lock:
+            if self._worker is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queued)
+                self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._drain, args=(self._queue,),
+                                                name='recommendation-log', daemon=True)
+                self._worker.start()
+            return self._queue
+    
+    def _drain(self, pending):
+        """Collect queued rows into batches and write them until stopped"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                rows = pending.get(timeout=timeout)
+            except queue.Empty:
+                rows = None
+            
+            if rows is self._STOP:
+                self._flush(batch)
+                return
+            if rows:
+                batch.extend(rows)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+    
+    def _flush(self, batch):
+        """Insert one batch in execute_many chunks of at most batch_size rows"""
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            try:
+                written = DatabaseConfig.execute_many(self.INSERT_QUERY, chunk)
+            except PoolExhaustedError as e:
+                print(e)
+                written = False
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['written' if written else 'failed'] += len(chunk)
+
+
+# Shared across all routes of this process
+recommendation_log = RecommendationLog()
+atexit.register(recommendation_log.close, 5)
@@ -1,45 +1,220 @@
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from app.models.models import Product
+from app.models.models import Product, PrecomputedRecommendation
 from app.config.config import Config
+from app.utils.cache import LRUCache, CleanedTextCache
+from app.utils.knn import KNNIndex, InvertedIndex, IVFIndex
+from app.utils.search import ProductSearchIndex
 import re
+import os
+import json
 import math
+import copy
+import hashlib
+import itertools
+import threading
+import time
+from datetime import datetime
+
+class CatalogDelta:
+    """Rows added to a model since its last full fit, kept apart from the fitted catalog
+    
+    New and rewritten products are appended here (a rewritten product's old
+    row is tombstoned), so an edit copies only this small segment. The next
+    full rebuild folds the rows back into the catalog.
+    """
+    
+    def __init__(self, products_df, tfidf_matrix, product_ids, feature_values):
+        self.products_df = products_df
+        self.tfidf_matrix = tfidf_matrix
+        self.product_ids = product_ids
+        self.feature_values = feature_values
+    
+    def __len__(self):
+        return len(self.product_ids)
+    
+    def appended(self, other):
+        """Return a new delta with the rows of other after these rows"""
+        return CatalogDelta(
+            pd.concat([self.products_df, other.products_df], ignore_index=True),
+            sparse.vstack([self.tfidf_matrix, other.tfidf_matrix], format='csr'),
+            np.concatenate([self.product_ids, other.product_ids]),
+            np.concatenate([self.feature_values, other.feature_values])
+        )
+
 
 class SkincareRecommender:
     """Skincare recommendation system using Content-Based Filtering and KNN"""
     
+    TFIDF_PARAMS = {
+        'stop_words': None,  # Indonesian stopwords not available in sklearn
+        'ngram_range': (1, 2),
+        'min_df': 1,
+        'max_df': 0.8,
+        'norm': 'l2',  # Unit rows: cosine similarity is a plain dot product
+        'dtype': np.float32
+    }
+    
+    # On-disk artifact layout, bump when the file set changes
+    ARTIFACT_FORMAT_VERSION = 3
+    ARTIFACT_COLUMNS = (
+        'id', 'name', 'brand', 'category', 'price', 'ingredients', 'skin_type',
+        'rating', 'image_url', 'created_at', 'updated_at', 'link_produk', 'marketplace',
+        'terjual', 'reviews'
+    )
+    NUMERIC_COLUMNS = ('id', 'price', 'rating')
+    
+    # In-memory catalog: text only needed to vectorize is dropped after fitting,
+    # low-cardinality strings are held as categorical codes
+    CATALOG_DROPPED_COLUMNS = ('description', 'combined_text')
+    CATALOG_CATEGORICAL_COLUMNS = (
+        'brand', 'marketplace', 'category', 'ingredients', 'skin_type', 'terjual', 'reviews'
+    )
+    
+    # Enum values of user_preferences (database/schema.sql)
+    PREFERENCE_ENUMS = {
+        'kondisi_kulit': ('berminyak', 'kering', 'kombinasi', 'sensitif', 'normal'),
+        'masalah_kulit': ('jerawat', 'komedo', 'kusam', 'kerutan', 'flek_hitam', 'pori_besar'),
+        'preferensi_produk': ('cleanser', 'moisturizer', 'serum', 'sunscreen', 'toner', 'semua'),
+        'rentang_harga': ('0-50000', '50000-100000', '100000-200000', '200000-500000', '500000+')
+    }
+    
+    # Upper price bound of each rentang_harga band (None = no ceiling)
+    PRICE_BANDS = (
+        ('0-50000', 50000),
+        ('50000-100000', 100000),
+        ('100000-200000', 200000),
+        ('200000-500000', 500000),
+        ('500000+', None)
+    )
+    FILTER_KEYS = ('min_price', 'max_price', 'brand', 'marketplace', 'min_rating', 'search')
+    
+    # Text cleaning: every ASCII byte except letters becomes a space (0 separates rows)
+    CLEAN_TEXT_TABLE = bytes(c if chr(c).isalpha() or c == 0 else 32 for c in range(256))
+    CLEAN_TEXT_PATTERN = re.compile(r'[^a-zA-Z\s]')
+    CLEAN_CHUNK_ROWS = 50000
+    TEXT_KEY_COLUMNS = ('name', 'brand', 'description')
+    
+    # Columns of the hybrid feature matrix, in order
+    HYBRID_FEATURES = ('price', 'rating', 'terjual', 'reviews')
+    
+    # sort_by value -> (column, descending); 'score' keeps the relevance order
+    SORT_KEYS = {
+        'price_low': ('price', False),
+        'price_high': ('price', True),
+        'rating': ('rating', True),
+        'name': ('name', False)
+    }
+    
     def __init__(self):
+        self.version = 0
         self.products_df = None
         self.tfidf_vectorizer = None
         self.tfidf_matrix = None
+        self.product_ids = None
+        self.active_mask = None
+        self.active_count = 0
+        self.doc_freq = None
+        self.document_count = 0
+        self.edited_rows = 0
+        self.use_precomputed = Config.USE_PRECOMPUTED_RECOMMENDATIONS
+        self.max_features = Config.TFIDF_MAX_FEATURES
+        self.knn_algorithm = Config.KNN_ALGORITHM
+        self.hybrid_scoring = Config.HYBRID_SCORING
+        self.hybrid_weights = dict(Config.HYBRID_WEIGHTS)
+        self.feature_values = None
+        self.feature_ranges = None
+        self.feature_matrix = None
+        self.delta = None
+        self.search_index = None
+        self.catalog_stats = None
+        self.text_cache = CleanedTextCache(Config.CLEANED_TEXT_CACHE) if Config.CLEANED_TEXT_CACHE else None
+        self._shared = {}  # Lazy arrays over the fitted rows, shared by every model derived from the fit
+        self._feature_matrix_ranges = None
+        self._catalog_signature = None
+        self._id_order = None
+        self._filter_index = None
+        self._candidate_cache = {}
+        self._candidate_cache_bytes = 0
+        self._sort_ranks = {}
+        self._delta_features = None
+        self._knn_index = None
     
-    def load_products(self):
-        """Load products from database"""
+    def load_products(self, use_artifacts=False):
+        """Load products from database (or from up-to-date on-disk artifacts)"""
+        if use_artifacts and self._artifacts_match_catalog():
+            return self.load_artifacts()
+        
         products = Product.get_all()
+        return self.load_from_records(products)
+    
+    def load_from_records(self, products):
+        """Build the model from a list of product dicts"""
         if not products:
             return False
         
         self.products_df = pd.DataFrame(products)
         self._preprocess_data()
         self._build_content_features()
+        self.search_index = ProductSearchIndex.build(self.products_df['combined_text'])
+        self._compact_catalog()
         return True
     
     def _preprocess_data(self):
-        """Preprocess product data"""
-        # Clean and normalize text data
-        self.products_df['deskripsi_clean'] = self.products_df['description'].apply(self._clean_text)
-        self.products_df['nama_clean'] = self.products_df['name'].apply(self._clean_text)
-        
-        # Combine text features for Content-Based Filtering
-        self.products_df['combined_text'] = (
-            self.products_df['nama_clean'] + ' ' + 
-            self.products_df['brand'] + ' ' + 
-            self.products_df['deskripsi_clean']
-        )
+        """Preprocess product data, reusing cleaned text of unchanged products"""
+        self.products_df = self._preprocess_frame(self.products_df, self.text_cache)
     
-    def _clean_text(self, text):
+    def _preprocess_frame(self, df, text_cache=None):
+        """Add the cleaned, combined text column to a product frame"""
+        keys = None
+        combined = [None] * len(df)
+        if text_cache is not None:
+            keys = pd.util.hash_pandas_object(
+                df.reindex(columns=list(self.TEXT_KEY_COLUMNS)).fillna('').astype(str), index=False
+            ).to_numpy()
+            combined = text_cache.lookup(keys)
+        
+        missing = [row for row, text in enumerate(combined) if text is None]
+        if missing:
+            frame = df.iloc[missing]
+            # Combine text features for Content-Based Filtering
+            texts = (
+                self._clean_series(frame['name']) + ' ' +
+                frame['brand'].fillna('').astype(str) + ' ' +
+                self._clean_series(frame['description'])
+            )
+            for row, text in zip(missing, texts):
+                combined[row] = text
+            if keys is not None:
+                text_cache.save(keys, combined)
+        
+        df['combined_text'] = combined
+        return df
+    
+    def _clean_series(self, values):
+        """Vectorized _clean_text: one translate and whitespace pass per chunk of ASCII rows"""
+        texts = values.fillna('').astype(str).tolist()
+        cleaned = [None] * len(texts)
+        ascii_rows = []
+        for row, text in enumerate(texts):
+            if text.isascii() and '\x00' not in text:
+                ascii_rows.append(row)
+            else:
+                cleaned[row] = self._clean_text(text)
+        
+        for start in range(0, len(ascii_rows), self.CLEAN_CHUNK_ROWS):
+            rows = ascii_rows[start:start + self.CLEAN_CHUNK_ROWS]
+            blob = '\x00'.join([texts[row] for row in rows]).lower().encode('ascii')
+            blob = b' '.join(blob.translate(self.CLEAN_TEXT_TABLE).split())
+            for row, text in zip(rows, blob.decode('ascii').split('\x00')):
+                cleaned[row] = text.strip()
+        
+        return pd.Series(cleaned, index=values.index, dtype=object)
+    
+    @classmethod
+    def _clean_text(cls, text):
         """Clean and normalize text"""
         if pd.isna(text):
             return ""
@@ -48,17 +223,17 @@ class SkincareRecommender:
         text = str(text).lower()
         
         # Remove special characters and numbers
-        text = re.sub(r'[^a-zA-Z\s]', ' ', text)
+        text = cls.CLEAN_TEXT_PATTERN.sub(' ', text)
         
         # Remove extra whitespace
         text = ' '.join(text.split())
         
         return text
     
-    def _normalize_feature(self, feature):
-        """Normalize numerical feature using Min-Max scaling"""
-        min_val = feature.min()
-        max_val = feature.max()
+    def _normalize_feature(self, feature, min_val=None, max_val=None):
+        """Normalize numerical feature using Min-Max scaling (over its own range by default)"""
+        min_val = feature.min() if min_val is None else min_val
+        max_val = feature.max() if max_val is None else max_val
         
         if max_val == min_val:
             return feature * 0  # All values are the same
@@ -68,19 +243,500 @@ class SkincareRecommender:
     def _build_content_features(self):
         """Build TF-IDF features for content-based filtering"""
         # Create TF-IDF vectorizer
-        self.tfidf_vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words=None,  # Indonesian stopwords not available in sklearn
-            ngram_range=(1, 2),
-            min_df=1,
-            max_df=0.8
-        )
+        self.tfidf_vectorizer = TfidfVectorizer(max_features=self.max_features or None, **self.TFIDF_PARAMS)
         
         # Fit and transform the combined text
         self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(self.products_df['combined_text'])
+        
+        # Row bookkeeping for incremental updates
+        self.delta = None
+        self._shared = {}
+        self.product_ids = self.products_df['id'].to_numpy()
+        self.active_mask = np.ones(len(self.products_df), dtype=bool)
+        self.active_count = len(self.products_df)
+        
+        # Document frequencies per vocabulary term, kept up to date by row edits
+        self.doc_freq = np.bincount(self.tfidf_matrix.indices, minlength=self.tfidf_matrix.shape[1])
+        self.document_count = self.tfidf_matrix.shape[0]
+        self.edited_rows = 0
+        
+        self._build_numeric_features()
+    
+    def _compact_catalog(self):
+        """Shrink products_df to compact columns once the text has been vectorized"""
+        df = self.products_df
+        raw_bytes = df.memory_usage(deep=True).sum()
+        
+        columns = {}
+        for column in df.columns:
+            if column not in self.CATALOG_DROPPED_COLUMNS:
+                columns[column] = self._compact_column(df[column], column)
+        # copy=False: numeric columns opened from artifacts stay memory-mapped
+        self.products_df = pd.DataFrame(columns, index=pd.RangeIndex(len(df)), copy=False)
+        
+        count = max(len(df), 1)
+        self.catalog_stats = {
+            'products': len(df),
+            'raw_bytes_per_product': float(raw_bytes / count),
+            'bytes_per_product': float(self.products_df.memory_usage(deep=True).sum() / count)
+        }
+    
+    def _compact_column(self, values, column):
+        """Convert one product column to its compact in-memory dtype"""
+        if column == 'id':
+            return pd.to_numeric(values, errors='coerce').fillna(0).astype(np.int32)
+        if column == 'price':
+            # harga is an INT column; keep whole prices integral so they render unchanged
+            prices = pd.to_numeric(values, errors='coerce').fillna(0)
+            return prices.astype(np.int32) if (prices % 1 == 0).all() else prices.astype(np.float32)
+        if column == 'rating':
+            return pd.to_numeric(values, errors='coerce').astype(np.float32)
+        if column in self.CATALOG_CATEGORICAL_COLUMNS:
+            return values.astype('category')
+        return values
+    
+    def _product_dict(self, position):
+        """Materialize one catalog row as a dict of plain Python values"""
+        df, row = self.products_df, position
+        if position >= len(df):
+            df, row = self.delta.products_df, position - len(df)
+        
+        product = {}
+        for column, values in df.items():
+            value = values.iat[row]
+            if isinstance(value, np.floating):
+                # Shortest repr, so float32 4.9 comes back as 4.9
+                value = float(str(value))
+            elif isinstance(value, np.generic):
+                value = value.item()
+            product[column] = value
+        return product
+    
+    def _conform_frame(self, frame):
+        """Cast a new product frame to the columns and non-categorical dtypes of products_df
+        
+        Categorical columns keep plain values: delta rows are few, and the
+        fitted catalog's categories are left untouched.
+        """
+        frame = frame.reindex(columns=self.products_df.columns)
+        for column, values in self.products_df.items():
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                frame[column] = self._compact_column(frame[column], column).astype(values.dtype)
+        return frame
+    
+    def _build_numeric_features(self):
+        """Build the float32 matrix of min-max normalized product signals for hybrid scoring"""
+        self.feature_values = self._feature_values(self.products_df)
+        self.feature_matrix, self.feature_ranges = self._normalize_features(self.feature_values)
+        self._feature_matrix_ranges = self.feature_ranges
+    
+    def _feature_values(self, df):
+        """Raw float32 signals of a product frame, one column per HYBRID_FEATURES entry"""
+        columns = []
+        for column in self.HYBRID_FEATURES:
+            if column not in df:
+                columns.append(np.zeros(len(df)))
+            elif column in ('terjual', 'reviews'):
+                # Counts are stored as display strings ('1,000++')
+                columns.append(pd.to_numeric(
+                    df[column].astype(str).str.replace(r'[^0-9]', '', regex=True), errors='coerce'
+                ).fillna(0).to_numpy(dtype=np.float64))
+            else:
+                columns.append(pd.to_numeric(df[column], errors='coerce').fillna(0).to_numpy(dtype=np.float64))
+        return np.column_stack(columns).astype(np.float32).reshape(len(df), len(self.HYBRID_FEATURES))
+    
+    def _normalize_features(self, values, ranges=None):
+        """Min-max normalize raw signals into the hybrid matrix; returns (matrix, ranges)
+        
+        Counts are log-scaled and cheaper products score higher on price.
+        ranges (scaled min and max per column) default to those of values.
+        """
+        ranges = self._feature_ranges_of(values) if ranges is None else ranges
+        matrix = np.empty(values.shape, dtype=np.float32)
+        for column_index, column in enumerate(self.HYBRID_FEATURES):
+            scaled = self._scale_feature(column, values[:, column_index].astype(np.float64))
+            normalized = self._normalize_feature(scaled, *ranges[column_index])
+            matrix[:, column_index] = 1 - normalized if column == 'price' else normalized
+        return matrix, ranges
+    
+    def _feature_ranges_of(self, values):
+        """Scaled (min, max) of every raw signal column, (0, 0) without rows"""
+        ranges = np.zeros((len(self.HYBRID_FEATURES), 2))
+        if len(values):
+            for column_index, column in enumerate(self.HYBRID_FEATURES):
+                raw = values[:, column_index].astype(np.float64)
+                # Both scales are monotonic: the range follows from the raw extremes
+                ranges[column_index] = self._scale_feature(column, np.array([raw.min(), raw.max()]))
+        return ranges
+    
+    @staticmethod
+    def _scale_feature(column, values):
+        """Counts are compared on a log scale, prices and ratings as they are"""
+        return np.log1p(values) if column in ('terjual', 'reviews') else values
+    
+    def save_artifacts(self, directory=None):
+        """Write the fitted model to a new versioned artifact directory"""
+        directory = directory or Config.RECOMMENDER_ARTIFACT_DIR
+        build_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        target = os.path.join(directory, build_id)
+        os.makedirs(target)
+        
+        # Tombstoned rows are dropped from the persisted model, delta rows folded in
+        keep = np.flatnonzero(self.active_mask)
+        products = self._frame_rows(keep)
+        matrix = self._row_vectors(keep).tocsr()
+        
+        arrays = {
+            'idf': self.tfidf_vectorizer.idf_,
+            'tfidf_data': matrix.data,
+            'tfidf_indices': matrix.indices,
+            'tfidf_indptr': matrix.indptr,
+            'doc_freq': np.bincount(matrix.indices, minlength=matrix.shape[1])
+        }
+        for column in self.ARTIFACT_COLUMNS:
+            if column in products:
+                arrays[f'column_{column}'] = self._column_to_array(products[column], column)
+        
+        for name, array in arrays.items():
+            np.save(os.path.join(target, f'{name}.npy'), np.ascontiguousarray(array))
+        
+        if self.search_index is not None:
+            ProductSearchIndex(self.search_index.full_matrix()[keep], self.search_index.vocabulary).save(target)
+        
+        # The IVF and block indexes are persisted with the matrix, so workers map them instead of rebuilding
+        ivf = None
+        if self.knn_algorithm == 'ivf':
+            index = self.build_ivf_index(matrix)
+            index.save(target)
+            ivf = {'n_lists': index.n_lists, 'configured_lists': Config.IVF_LISTS}
+        knn = None
+        if self.knn_algorithm == 'index':
+            KNNIndex.build(matrix, Config.KNN_BLOCK_SIZE).save(target)
+            knn = {'block_size': Config.KNN_BLOCK_SIZE}
+        
+        with open(os.path.join(target, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+            json.dump({term: int(idx) for term, idx in self.tfidf_vectorizer.vocabulary_.items()}, file)
+        
+        manifest = {
+            'format_version': self.ARTIFACT_FORMAT_VERSION,
+            'build_id': build_id,
+            'created_at': datetime.now().isoformat(),
+            'product_count': int(matrix.shape[0]),
+            'vocabulary_size': int(matrix.shape[1]),
+            'last_updated': self._timestamp_key(products['updated_at'].max()) if 'updated_at' in products else None,
+            'columns': [column for column in self.ARTIFACT_COLUMNS if column in products],
+            'search': self.search_index is not None,
+            'ivf': ivf,
+            'knn': knn
+        }
+        with open(os.path.join(target, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+        
+        # Point CURRENT at the new build atomically so readers never see a partial one
+        pointer = os.path.join(directory, 'CURRENT')
+        with open(pointer + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(build_id)
+        os.replace(pointer + '.tmp', pointer)
+        
+        return target
+    
+    def load_artifacts(self, directory=None):
+        """Open the current on-disk model with memory-mapped arrays"""
+        directory = directory or Config.RECOMMENDER_ARTIFACT_DIR
+        manifest = self.read_artifact_manifest(directory)
+        if manifest is None:
+            return False
+        
+        target = os.path.join(directory, manifest['build_id'])
+        
+        def load(name):
+            return np.load(os.path.join(target, f'{name}.npy'), mmap_mode='r')
+        
+        with open(os.path.join(target, 'vocabulary.json'), encoding='utf-8') as file:
+            vocabulary = json.load(file)
+        
+        # Rebuild the vectorizer from the stored vocabulary and IDF, no refit
+        self.tfidf_vectorizer = TfidfVectorizer(vocabulary=vocabulary, **self.TFIDF_PARAMS)
+        self.tfidf_vectorizer.idf_ = np.asarray(load('idf'))
+        
+        shape = (manifest['product_count'], manifest['vocabulary_size'])
+        self.tfidf_matrix = sparse.csr_matrix(
+            (load('tfidf_data'), load('tfidf_indices'), load('tfidf_indptr')), shape=shape, copy=False
+        )
+        
+        columns = {}
+        for column in manifest['columns']:
+            values = load(f'column_{column}')
+            columns[column] = values.astype(object) if values.dtype.kind == 'U' else values
+        self.products_df = pd.DataFrame(columns, copy=False)
+        self._compact_catalog()
+        
+        self.delta = None
+        self._shared = {}
+        self.product_ids = self.products_df['id'].to_numpy()
+        self.active_mask = np.ones(shape[0], dtype=bool)
+        self.active_count = shape[0]
+        self.doc_freq = np.array(load('doc_freq'))
+        self.document_count = shape[0]
+        self.edited_rows = 0
+        self._build_numeric_features()
+        self.search_index = ProductSearchIndex.load(target) if manifest.get('search') else None
+        
+        # Reuse the persisted IVF or block index unless it was built with other settings
+        ivf = manifest.get('ivf')
+        if self.knn_algorithm == 'ivf' and ivf and ivf['configured_lists'] == Config.IVF_LISTS:
+            self._knn_index = IVFIndex.load(target, self.tfidf_matrix, Config.IVF_PROBES)
+        knn = manifest.get('knn')
+        if self.knn_algorithm == 'index' and knn and knn['block_size'] == Config.KNN_BLOCK_SIZE:
+            self._knn_index = KNNIndex.load(target, self.tfidf_matrix, Config.KNN_BLOCK_SIZE)
+        return True
+    
+    @classmethod
+    def read_artifact_manifest(cls, directory=None):
+        """Read the manifest of the current artifact build, or None"""
+        directory = directory or Config.RECOMMENDER_ARTIFACT_DIR
+        try:
+            with open(os.path.join(directory, 'CURRENT'), encoding='utf-8') as file:
+                build_id = file.read().strip()
+            with open(os.path.join(directory, build_id, 'manifest.json'), encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return None
+        
+        if manifest.get('format_version') != cls.ARTIFACT_FORMAT_VERSION:
+            return None
+        return manifest
+    
+    def _artifacts_match_catalog(self):
+        """Check the current artifacts were built from the catalog in the database"""
+        manifest = self.read_artifact_manifest()
+        if manifest is None:
+            return False
+        
+        state = Product.get_catalog_state()
+        if not state:
+            return False
+        return (state['total'] == manifest['product_count'] and
+                self._timestamp_key(state['last_updated']) == manifest['last_updated'])
+    
+    @staticmethod
+    def _timestamp_key(value):
+        """Normalize a timestamp for manifest comparison"""
+        if value is None or pd.isna(value):
+            return None
+        return pd.Timestamp(value).isoformat()
+    
+    def _column_to_array(self, values, column):
+        """Convert a product column to a fixed-width array that np.load can map"""
+        if column in self.NUMERIC_COLUMNS:
+            return pd.to_numeric(values, errors='coerce').fillna(0).to_numpy()
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.to_numpy(dtype='datetime64[us]')
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        return values.fillna('').astype(str).to_numpy(dtype=str)
+    
+    def with_product_change(self, action, product_id, product=None):
+        """Return a new model with one product row appended, replaced or tombstoned
+        
+        The vocabulary and IDF weights stay frozen; only the changed row is
+        vectorized. Call vocabulary_drift() to decide when a full refit is due.
+        """
+        return self.with_product_changes([(action, product_id, product)])
+    
+    def with_product_changes(self, changes):
+        """Return a new model with (action, product_id, product) changes applied in one copy
+        
+        The last change to a product wins; deleting an unknown product does nothing.
+        """
+        if self.products_df is None:
+            return None
+        
+        latest = {}
+        for action, product_id, product in changes:
+            latest[product_id] = None if action == 'delete' else product
+        
+        positions = []
+        products = []
+        for product_id, position in zip(latest, self._lookup_positions(list(latest))):
+            position = int(position) if position >= 0 else None
+            if position is None and latest[product_id] is None:
+                continue
+            positions.append(position)
+            products.append(latest[product_id])
+        
+        if not products:
+            return self
+        return self._copy_with_rows(positions, products)
+    
+    def vocabulary_drift(self):
+        """Measure how far incremental edits moved away from the fitted vocabulary"""
+        fitted_idf = self.tfidf_vectorizer.idf_
+        live_idf = np.log((1 + self.document_count) / (1 + self.doc_freq)) + 1
+        idf_shift = np.abs(live_idf - fitted_idf).sum() / fitted_idf.sum()
+        
+        # Edited rows may use terms the frozen vocabulary cannot represent
+        edited_share = self.edited_rows / max(len(self.product_ids), 1)
+        
+        return max(idf_shift, edited_share)
+    
+    @property
+    def catalog_watermark(self):
+        """Latest updated_at in the catalog, the starting point of the next delta sync"""
+        if self.products_df is None or 'updated_at' not in self.products_df:
+            return None
+        latest = pd.Series([pd.to_datetime(frame['updated_at']).max() for frame in self._frames()]).max()
+        return None if pd.isna(latest) else latest
+    
+    def stale_products(self, products):
+        """Product dicts from the database whose row is missing here or has another updated_at"""
+        stale = []
+        positions = self._lookup_positions([product['id'] for product in products])
+        updated = self._timestamps_at(np.maximum(positions, 0))
+        for product, position, updated_at in zip(products, positions, updated):
+            if position < 0 or pd.Timestamp(updated_at) != pd.Timestamp(product['updated_at']):
+                stale.append(product)
+        return stale
+    
+    def _position_of(self, product_id):
+        """Row position of an active product, or None"""
+        if product_id is None:
+            return None
+        position = self._lookup_positions([product_id])[0]
+        return int(position) if position >= 0 else None
+    
+    def _copy_with_rows(self, positions, products):
+        """Copy this model, tombstoning the rows at positions and appending the products that are not None
+        
+        positions[i] is None for a new product, products[i] is None for a
+        deletion; positions must be distinct. Written rows go to the delta
+        segment, so an edit copies the delta and the active mask but never
+        the fitted catalog; the next rebuild merges the delta back in.
+        """
+        model = copy.copy(self)
+        model._catalog_signature = None
+        model._id_order = None
+        model._filter_index = None
+        model._candidate_cache = {}
+        model._candidate_cache_bytes = 0
+        model._sort_ranks = {}
+        model._delta_features = None
+        model.edited_rows += len(products)
+        
+        # Remove the old rows from the document frequencies
+        old_positions = np.array([position for position in positions if position is not None], dtype=np.intp)
+        model.doc_freq = self.doc_freq - np.bincount(
+            self._row_vectors(old_positions).indices, minlength=len(self.doc_freq))
+        model.document_count -= len(old_positions)
+        
+        # Tombstone: the old row stays in its segment but is never recommended
+        written = [product for product in products if product is not None]
+        model.active_mask = np.concatenate([self.active_mask, np.ones(len(written), dtype=bool)])
+        model.active_mask[old_positions] = False
+        model.active_count += len(written) - len(old_positions)
+        if not written:
+            model.feature_ranges = self._feature_ranges_after(
+                old_positions, model.active_mask, np.empty((0, len(self.HYBRID_FEATURES))))
+            return model
+        
+        frame = self._preprocess_frame(pd.DataFrame(written))
+        rows = self.tfidf_vectorizer.transform(frame['combined_text'])
+        model.doc_freq += np.bincount(rows.indices, minlength=len(self.doc_freq))
+        model.document_count += len(written)
+        
+        if self.search_index is not None:
+            replaced = [position for position, product in zip(positions, products)
+                        if position is not None and product is not None]
+            model.search_index = self.search_index.with_rows(frame['combined_text'].tolist(), replaced)
+        
+        values = self._feature_values(frame)
+        model.feature_ranges = self._feature_ranges_after(old_positions, model.active_mask, values)
+        
+        product_ids = np.array([product['id'] for product in written], dtype=np.int64)
+        delta = CatalogDelta(self._conform_frame(frame), rows, product_ids, values)
+        model.delta = delta if self.delta is None else self.delta.appended(delta)
+        return model
+    
+    def _feature_ranges_after(self, old_positions, active_mask, values):
+        """Feature ranges over the active rows once old_positions are gone and rows with raw values are added
+        
+        Tombstoned rows never count; the ranges are recomputed from the
+        remaining rows only when a removed row held an extreme.
+        """
+        ranges = self.feature_ranges
+        if self.active_count == len(old_positions):
+            return self._feature_ranges_of(values)
+        
+        if len(old_positions):
+            removed = self._feature_ranges_of(self._feature_values_at(old_positions))
+            if (removed[:, 0] <= ranges[:, 0]).any() or (removed[:, 1] >= ranges[:, 1]).any():
+                kept = np.flatnonzero(active_mask[:len(self.active_mask)])
+                ranges = self._feature_ranges_of(self._feature_values_at(kept))
+        if len(values):
+            added = self._feature_ranges_of(values)
+            ranges = np.column_stack([np.minimum(ranges[:, 0], added[:, 0]), np.maximum(ranges[:, 1], added[:, 1])])
+        return ranges
+    
+    def _frames(self):
+        """The product frames of the fitted catalog and the delta segment"""
+        return [self.products_df] + ([self.delta.products_df] if self.delta is not None else [])
+    
+    def _gather(self, positions, fitted, delta):
+        """Rows at catalog positions, in order, from an array over the fitted rows and one over the delta"""
+        positions = np.asarray(positions, dtype=np.intp)
+        in_delta = positions >= fitted.shape[0]
+        if delta is None or not in_delta.any():
+            return fitted[positions]
+        if in_delta.all():
+            return delta[positions - fitted.shape[0]]
+        
+        parts = (fitted[positions[~in_delta]], delta[positions[in_delta] - fitted.shape[0]])
+        rows = sparse.vstack(parts, format='csr') if sparse.issparse(fitted) else np.concatenate(parts)
+        if in_delta[np.argmax(in_delta):].all():
+            return rows
+        # Stacked rows are fitted-first; put them back in position order
+        return rows[np.argsort(np.concatenate([np.flatnonzero(~in_delta), np.flatnonzero(in_delta)]))]
+    
+    def _row_vectors(self, positions):
+        """TF-IDF rows of the products at positions"""
+        return self._gather(positions, self.tfidf_matrix, None if self.delta is None else self.delta.tfidf_matrix)
+    
+    def _ids_at(self, positions):
+        """Product ids at positions"""
+        return self._gather(positions, self.product_ids, None if self.delta is None else self.delta.product_ids)
+    
+    def _feature_values_at(self, positions):
+        """Raw hybrid signals of the products at positions"""
+        return self._gather(positions, self.feature_values,
+                            None if self.delta is None else self.delta.feature_values)
+    
+    def _frame_rows(self, positions):
+        """Catalog rows at ascending positions as one frame"""
+        positions = np.asarray(positions, dtype=np.intp)
+        fitted = len(self.products_df)
+        frame = self.products_df.iloc[positions[positions < fitted]]
+        if self.delta is not None:
+            frame = pd.concat([frame, self.delta.products_df.iloc[positions[positions >= fitted] - fitted]],
+                              ignore_index=True)
+        return frame
+    
+    def _timestamps_at(self, positions):
+        """updated_at of the products at positions as datetime64 values"""
+        fitted = pd.to_datetime(self.products_df['updated_at']).to_numpy()
+        delta = None if self.delta is None else pd.to_datetime(self.delta.products_df['updated_at']).to_numpy()
+        return self._gather(positions, fitted, delta)
     
     def _create_user_profile(self, preferences):
         """Create user profile vector from preferences"""
+        user_query = self._profile_text(preferences)
+        
+        # Transform user query using existing TF-IDF vectorizer
+        user_tfidf = self.tfidf_vectorizer.transform([user_query])
+        
+        return user_tfidf
+    
+    def _profile_text(self, preferences):
+        """Build the cleaned query text for a preference profile"""
         # Create user query text based on preferences
         user_text_parts = []
         
@@ -119,68 +775,664 @@ class SkincareRecommender:
         
         # Combine all text parts
         user_query = ' '.join(user_text_parts)
-        user_query = self._clean_text(user_query)
-        
-        # Transform user query using existing TF-IDF vectorizer
-        user_tfidf = self.tfidf_vectorizer.transform([user_query])
-        
-        return user_tfidf
+        return self._clean_text(user_query)
+    
+    def cache_key(self, preferences, max_recommendations=10, k_value=None, filters=None):
+        """Canonical key of everything in preferences that affects the result"""
+        k = k_value if k_value is not None else Config.KNN_K_VALUE
+        return (
+            preferences.get('kondisi_kulit'),
+            preferences.get('masalah_kulit'),
+            preferences.get('preferensi_produk'),
+            preferences.get('jenis_kulit') or None,
+            self._clean_text(preferences.get('kata_kunci_preferensi') or ''),
+            self._clean_text(preferences.get('kata_kunci') or ''),
+            max_recommendations,
+            k,
+            self._filter_key(filters)
+        )
     
-    def get_recommendations(self, preferences, max_recommendations=10, k_value=None):
-        """Get product recommendations using Content-Based Filtering and KNN"""
+    def get_recommendations(self, preferences, max_recommendations=10, k_value=None, filters=None):
+        """Get product recommendations using Content-Based Filtering and KNN
+        
+        filters may hold min_price, max_price, brand, marketplace and min_rating;
+        only matching products are scored, so a full list is returned whenever
+        enough products match.
+        """
         # Load products if not already loaded
         if self.products_df is None:
             if not self.load_products():
                 return []
-
+        
         # Use provided k_value or default from config
         k = k_value if k_value is not None else Config.KNN_K_VALUE
+        filter_key = self._filter_key(filters)
+        
+        # Keyword-free profiles are served from the precomputed table when it is current
+        # (rows are computed with the price band of the profile as the only filter)
+        if (self.use_precomputed and self._is_keyword_free(preferences) and
+                filter_key == self._filter_key(self.price_band_filters(preferences['rentang_harga']))):
+            recommendations = self._precomputed_recommendations(preferences, max_recommendations, k)
+            if recommendations is not None:
+                return recommendations
+        
+        top_indices, top_similarities = self.rank_candidates(preferences, max_recommendations, k, filters)
+        return self._build_recommendations(top_indices, top_similarities, preferences, k)
+    
+    def rank_candidates(self, preferences, limit, k_value=None, filters=None, min_similarity=None):
+        """Positions and similarities of up to limit matching products, most relevant first
+        
+        The nearest-neighbour query is always for limit products; k_value only
+        keys the result and decides which of them _build_recommendations flags
+        as the k nearest (is_neighbor, knn_rank). With min_similarity, products
+        whose similarity is not above it are left out.
+        """
+        positions, similarities = self._rank_candidates(preferences, limit, filters)
+        if min_similarity is not None:
+            relevant = similarities > min_similarity
+            positions, similarities = positions[relevant], similarities[relevant]
+        return positions, similarities
+    
+    def _rank_candidates(self, preferences, limit, filters=None):
+        """Unfiltered rank_candidates: the top limit matching products, whatever their similarity"""
+        if self.products_df is None:
+            if not self.load_products():
+                return np.empty(0, dtype=np.intp), np.empty(0)
         
         # Create user profile based on preferences
         user_features = self._create_user_profile(preferences)
+        filter_key = self._filter_key(filters)
         
-        # Get content-based similarities using cosine similarity
-        content_similarities = cosine_similarity(user_features, self.tfidf_matrix).flatten()
+        # Query the KNN index, restricted to products that pass the hard filters
+        # (blended hybrid scores have no index bounds, so hybrid mode scores all candidates)
+        if self.knn_algorithm != 'brute' and not self.hybrid_scoring:
+            if filter_key:
+                mask, candidates = self._candidate_set(filter_key)
+                available = len(candidates)
+            else:
+                mask = self.active_mask if self.active_count < len(self.active_mask) else None
+                available = self.active_count
+            return self._knn_search(user_features, min(limit, available), mask)
         
-        # Calculate KNN distances for all products
-        product_distances = []
+        # Brute force: score every product that passes the hard filters
+        candidates = self._candidate_positions(filter_key)
+        content_similarities = self._similarities(user_features, candidates)[0]
         
-        for idx, row in self.products_df.iterrows():
-            # Get content similarity score for this product
-            content_score = content_similarities[idx]
-            
-            # For KNN, we use content similarity as the main feature
-            # The distance is simply 1 - cosine_similarity (closer to 1 = more similar)
-            knn_distance = 1 - content_score
+        # Take top K nearest neighbors without sorting the whole catalog
+        return self._rank(content_similarities, limit, candidates)
+    
+    def _get_knn_index(self):
+        """Lazily build the nearest-neighbour index (exact, postings or IVF) over the product vectors"""
+        if self._knn_index is None:
+            if self.knn_algorithm == 'ivf':
+                self._knn_index = self.build_ivf_index(self.tfidf_matrix)
+            elif self.knn_algorithm == 'inverted':
+                self._knn_index = InvertedIndex(self.tfidf_matrix)
+            else:
+                self._knn_index = KNNIndex.build(self.tfidf_matrix, Config.KNN_BLOCK_SIZE)
+        return self._knn_index
+    
+    @staticmethod
+    def build_ivf_index(matrix):
+        """Build an IVF index with the configured list count and training settings"""
+        return IVFIndex.build(
+            matrix, n_lists=Config.IVF_LISTS, n_probe=Config.IVF_PROBES,
+            iterations=Config.IVF_ITERATIONS, sample_size=Config.IVF_TRAIN_SAMPLE,
+            max_cells=Config.BATCH_SCORE_MAX_CELLS
+        )
+    
+    def _knn_search(self, query, n, mask=None):
+        """Exact n nearest products: the index covers the fitted rows, delta rows are scored next to it"""
+        fitted = self.tfidf_matrix.shape[0]
+        positions, similarities = self._get_knn_index().search(
+            query, n, None if mask is None else mask[:fitted])
+        if self.delta is None:
+            return positions, similarities
+        
+        delta = fitted + np.flatnonzero((self.active_mask if mask is None else mask)[fitted:])
+        if len(delta):
+            delta_similarities = (self.delta.tfidf_matrix[delta - fitted] @ query.T).toarray().ravel()
+            positions, similarities = KNNIndex._merge(positions, similarities, delta, delta_similarities, n)
+        return positions, similarities
+    
+    def get_recommendation_page(self, ranked, preferences, sort_by='score', page=1, per_page=None,
+                                k_value=None):
+        """Slice one page out of a ranked candidate set from rank_candidates
+        
+        Only the products on the requested page are materialized.
+        """
+        positions, similarities = ranked
+        per_page = per_page or Config.RECOMMENDATIONS_PER_PAGE
+        total = len(positions)
+        pages = max(1, math.ceil(total / per_page))
+        page = min(max(page, 1), pages)
+        
+        order = self._sort_order(positions, sort_by)
+        selected = order[(page - 1) * per_page:page * per_page]
+        return {
+            'recommendations': self._build_recommendations(
+                positions[selected], similarities[selected], preferences, k_value, selected),
+            'page': page,
+            'per_page': per_page,
+            'pages': pages,
+            'total': total,
+            'sort_by': sort_by if sort_by in self.SORT_KEYS else 'score'
+        }
+    
+    def _sort_order(self, positions, sort_by):
+        """Order of a ranked candidate set for sort_by, ties kept in relevance order"""
+        if sort_by not in self.SORT_KEYS:
+            return np.arange(len(positions))
+        
+        column, descending = self.SORT_KEYS[sort_by]
+        ranks = self._sort_ranks_at(column, positions)
+        return np.argsort(-ranks if descending else ranks, kind='stable')
+    
+    def _sort_ranks_at(self, column, positions):
+        """Ranks of the products at positions by column (equal values share a rank)"""
+        fitted, delta = self._get_sort_ranks(column)
+        if delta is None:
+            return fitted[positions]
+        
+        # A delta value between two fitted values ranks between them, then by its place among the delta
+        between, within = delta
+        positions = np.asarray(positions, dtype=np.intp)
+        ranks = self._gather(positions, fitted, between) * (len(between) + 2)
+        in_delta = positions >= len(fitted)
+        ranks[in_delta] += within[positions[in_delta] - len(fitted)]
+        return ranks
+    
+    def _get_sort_ranks(self, column):
+        """Lazily build (fitted ranks, delta ranks) by column
+        
+        Fitted rows get even dense ranks, shared by every model derived from
+        the fit. Delta rows get (odd rank between two fitted values or the
+        fitted rank of an equal value, dense rank among the delta or 0).
+        """
+        ranks = self._sort_ranks.get(column)
+        if ranks is None:
+            fitted = self._shared.get(('sort', column))
+            if fitted is None:
+                unique, inverse = np.unique(self._sort_values(self.products_df[column]), return_inverse=True)
+                fitted = self._shared[('sort', column)] = (unique, inverse.astype(np.int64) * 2)
+            unique, fitted_ranks = fitted
             
-            # Store product with its distance and content similarity
-            product_distances.append({
-                'index': idx,
-                'distance': knn_distance,
-                'product': row.to_dict(),
-                'content_similarity': content_score,
-                'explanation': self._generate_explanation(content_score, preferences)
-            })
+            delta = None
+            if self.delta is not None:
+                values = self._sort_values(self.delta.products_df[column])
+                found = np.searchsorted(unique, values)
+                equal = found < len(unique)
+                equal[equal] = unique[found[equal]] == values[equal]
+                within = np.unique(values, return_inverse=True)[1].astype(np.int64) + 1
+                delta = (found * 2 - ~equal, np.where(equal, 0, within))
+            ranks = self._sort_ranks[column] = (fitted_ranks, delta)
+        return ranks
+    
+    @staticmethod
+    def _sort_values(values):
+        """Comparable array of a catalog column"""
+        if pd.api.types.is_numeric_dtype(values):
+            return pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        # Text sorts ignore case, like the database collation
+        return values.fillna('').astype(str).str.lower().to_numpy(dtype=str)
+    
+    def search_products(self, query, page=1, per_page=20, sort_by='relevance', brand=None):
+        """One page of product ids matching a text query, ranked by BM25 relevance or sort_by
+        
+        Returns a dict with ids, total, page, per_page and pages, or None when
+        the model has no search index.
+        """
+        if self.search_index is None:
+            return None
+        
+        filter_key = self._filter_key({'brand': brand})
+        mask = self._candidate_set(filter_key)[0] if filter_key else self.active_mask
+        positions, _ = self.search_index.search(self._clean_text(query).split(), mask)
+        positions = positions[self._sort_order(positions, sort_by)]
+        
+        total = len(positions)
+        pages = max(1, math.ceil(total / per_page))
+        page = min(max(page, 1), pages)
+        start = (page - 1) * per_page
+        return {
+            'ids': [int(product_id) for product_id in self._ids_at(positions[start:start + per_page])],
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': pages
+        }
+    
+    def _search_mask(self, query):
+        """Boolean mask of products matching every term of a cleaned search query"""
+        mask = np.zeros(len(self.active_mask), dtype=bool)
+        mask[self.search_index.search(query.split(), self.active_mask)[0]] = True
+        return mask
+    
+    def _similarities(self, queries, candidates=None):
+        """Cosine similarity of query rows against all products or a candidate subset
+        
+        Product rows and queries are L2-normalized, so this is one sparse
+        product without re-normalizing either side.
+        """
+        if candidates is None:
+            similarities = (self.tfidf_matrix @ queries.T).T.toarray()
+            if self.delta is not None:
+                similarities = np.hstack([similarities, (self.delta.tfidf_matrix @ queries.T).T.toarray()])
+            return similarities
+        
+        matrix = self._row_vectors(candidates)
+        if matrix.shape[0] == 0:
+            return np.empty((queries.shape[0], 0), dtype=np.float32)
+        return (matrix @ queries.T).T.toarray()
+    
+    def _rank(self, content_similarities, n, candidates=None):
+        """Positions and similarities of the n nearest products for one similarity row
+        
+        content_similarities covers the whole catalog, or the candidate
+        positions when a filtered subset was scored. In hybrid mode products
+        are ordered by the blended score; content similarities are returned.
+        """
+        scores = content_similarities
+        if self.hybrid_scoring:
+            scores = self._hybrid_scores(content_similarities, candidates)
+        
+        # For KNN, the distance is simply 1 - cosine_similarity (closer to 0 = more similar)
+        knn_distances = 1 - scores
+        
+        if candidates is not None:
+            top = self._top_n_indices(knn_distances, n)
+            return candidates[top], content_similarities[top]
         
-        # Sort by KNN distance (ascending - smaller distance = more similar)
-        product_distances.sort(key=lambda x: x['distance'])
+        # Tombstoned (deleted) products are never recommended
+        if self.active_count < len(knn_distances):
+            knn_distances[~self.active_mask] = np.inf
         
-        # Take top K nearest neighbors
-        knn_recommendations = product_distances[:max_recommendations]
+        top = self._top_n_indices(knn_distances, min(n, self.active_count))
+        return top, content_similarities[top]
+    
+    def _hybrid_scores(self, content_similarities, candidates=None):
+        """Blend content similarity with the product signals in one vectorized pass"""
+        feature_weights = np.array(
+            [self.hybrid_weights.get(column, 0.0) for column in self.HYBRID_FEATURES], dtype=np.float32)
+        return self.hybrid_weights.get('content', 1.0) * content_similarities + self._feature_scores(
+            feature_weights, candidates)
+    
+    def _feature_scores(self, weights, candidates=None):
+        """Weighted sum of the normalized signals of all products or the candidates, under feature_ranges"""
+        fitted_weights, offset = self._rescaled_weights(weights)
+        fitted = len(self.feature_matrix)
+        if candidates is None:
+            scores = self.feature_matrix @ fitted_weights + offset
+            if self.delta is not None:
+                scores = np.concatenate([scores, self._get_delta_features() @ weights])
+            return scores
+        
+        candidates = np.asarray(candidates, dtype=np.intp)
+        in_delta = candidates >= fitted
+        scores = np.empty(len(candidates), dtype=np.float32)
+        scores[~in_delta] = self.feature_matrix[candidates[~in_delta]] @ fitted_weights + offset
+        if in_delta.any():
+            scores[in_delta] = self._get_delta_features()[candidates[in_delta] - fitted] @ weights
+        return scores
+    
+    def _rescaled_weights(self, weights):
+        """(weights, offset) that score feature_matrix as if it were normalized over feature_ranges
+        
+        feature_matrix keeps the ranges of the fit; when edits moved them
+        every column is an affine function of the stored one, so the
+        fitted rows are rescored without renormalizing them.
+        """
+        if np.array_equal(self._feature_matrix_ranges, self.feature_ranges):
+            return weights, 0.0
         
-        # Convert to final format
+        scale = np.zeros(len(weights))
+        offset = 0.0
+        for column_index, column in enumerate(self.HYBRID_FEATURES):
+            (fitted_low, fitted_high), (low, high) = (self._feature_matrix_ranges[column_index],
+                                                      self.feature_ranges[column_index])
+            weight = float(weights[column_index])
+            if high == low:
+                # A constant column normalizes to 0 (1 on the inverted price scale)
+                offset += weight if column == 'price' else 0.0
+            elif fitted_high == fitted_low:
+                normalized = (fitted_low - low) / (high - low)
+                offset += weight * (1 - normalized if column == 'price' else normalized)
+            else:
+                ratio = (fitted_high - fitted_low) / (high - low)
+                shift = (fitted_low - low) / (high - low)
+                scale[column_index] = weight * ratio
+                offset += weight * (1 - ratio - shift if column == 'price' else shift)
+        return scale.astype(np.float32), np.float32(offset)
+    
+    def _get_delta_features(self):
+        """Lazily normalize the delta's raw signals over feature_ranges"""
+        if self._delta_features is None:
+            self._delta_features = self._normalize_features(self.delta.feature_values, self.feature_ranges)[0]
+        return self._delta_features
+    
+    @classmethod
+    def price_band(cls, budget_max):
+        """rentang_harga band for a maximum budget"""
+        if budget_max is None:
+            return cls.PRICE_BANDS[-1][0]
+        for band, upper in cls.PRICE_BANDS:
+            if upper is None or budget_max <= upper:
+                return band
+        return cls.PRICE_BANDS[-1][0]
+    
+    @classmethod
+    def price_band_filters(cls, rentang_harga):
+        """Hard filters for a rentang_harga band, used as a budget ceiling"""
+        upper = dict(cls.PRICE_BANDS).get(rentang_harga)
+        return {'max_price': upper} if upper is not None else {}
+    
+    @classmethod
+    def _filter_key(cls, filters):
+        """Normalized, hashable form of a filters dict (empty tuple = no filters)"""
+        if not filters:
+            return ()
+        
+        key = []
+        for name in cls.FILTER_KEYS:
+            value = filters.get(name)
+            if value is None or value == '':
+                continue
+            if name in ('brand', 'marketplace'):
+                value = str(value).strip().lower()
+            elif name == 'search':
+                value = cls._clean_text(value)
+                if not value:
+                    continue
+            else:
+                value = float(value)
+                if name == 'min_price' and value <= 0:
+                    continue
+            key.append((name, value))
+        return tuple(key)
+    
+    def _get_filter_index(self):
+        """Lazily build the column arrays the hard filters are evaluated on, one index per segment
+        
+        The fitted catalog's index is shared by every model derived from the fit.
+        """
+        if self._filter_index is None:
+            fitted = self._shared.get('filter_index')
+            if fitted is None:
+                fitted = self._shared['filter_index'] = self._segment_filter_index(self.products_df)
+            self._filter_index = [fitted]
+            if self.delta is not None:
+                self._filter_index.append(self._segment_filter_index(self.delta.products_df))
+        return self._filter_index
+    
+    def _segment_filter_index(self, df):
+        """Filter column arrays of one segment's product frame"""
+        prices = pd.to_numeric(df['price'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        ratings = pd.to_numeric(df['rating'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        price_order = np.argsort(prices, kind='stable')
+        
+        index = {
+            'price_order': price_order,
+            'sorted_prices': prices[price_order],
+            'ratings': ratings
+        }
+        for column in ('brand', 'marketplace'):
+            values = df[column] if column in df else pd.Series('', index=df.index)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Normalize the categories once and remap the stored codes
+                category_codes, labels = pd.factorize(
+                    pd.Index(values.cat.categories).astype(str).str.strip().str.lower())
+                codes = np.append(category_codes, -1)[values.cat.codes]
+            else:
+                codes, labels = pd.factorize(values.fillna('').astype(str).str.strip().str.lower())
+            index[column] = (codes, {label: code for code, label in enumerate(labels)})
+        return index
+    
+    def _candidate_positions(self, filter_key):
+        """Ascending row positions of active products matching filter_key, or None if unfiltered"""
+        if not filter_key:
+            return None
+        return self._candidate_set(filter_key)[1]
+    
+    def _candidate_set(self, filter_key):
+        """(mask, ascending positions) of active products matching a non-empty filter_key
+        
+        Only the int32 positions are cached, up to CANDIDATE_CACHE_BYTES per
+        model; the mask is rebuilt from them on every call.
+        """
+        positions = self._candidate_cache.get(filter_key)
+        if positions is None:
+            positions = self._filter_positions(filter_key)
+            if self._candidate_cache_bytes + positions.nbytes > Config.CANDIDATE_CACHE_BYTES:
+                # Start a new dict rather than clear(): other threads may be reading the old one
+                self._candidate_cache = {}
+                self._candidate_cache_bytes = 0
+            self._candidate_cache[filter_key] = positions
+            self._candidate_cache_bytes += positions.nbytes
+        
+        mask = np.zeros(len(self.active_mask), dtype=bool)
+        mask[positions] = True
+        return mask, positions
+    
+    def _filter_positions(self, filter_key):
+        """Ascending int32 row positions of active products matching a non-empty filter_key"""
+        filters = dict(filter_key)
+        mask = self.active_mask.copy()
+        first = 0
+        for index in self._get_filter_index():
+            rows = len(index['ratings'])
+            mask[first:first + rows] &= self._filter_matches(index, filters)
+            first += rows
+        
+        if 'search' in filters and self.search_index is not None:
+            mask &= self._search_mask(filters['search'])
+        
+        return np.flatnonzero(mask).astype(np.int32)
+    
+    @staticmethod
+    def _filter_matches(index, filters):
+        """Boolean array over one segment's rows: products passing the column filters"""
+        matches = np.ones(len(index['ratings']), dtype=bool)
+        
+        # Price range from the sorted price index
+        if 'min_price' in filters or 'max_price' in filters:
+            sorted_prices = index['sorted_prices']
+            low = np.searchsorted(sorted_prices, filters['min_price'], 'left') if 'min_price' in filters else 0
+            high = (np.searchsorted(sorted_prices, filters['max_price'], 'right')
+                    if 'max_price' in filters else len(sorted_prices))
+            in_range = np.zeros(len(matches), dtype=bool)
+            in_range[index['price_order'][low:high]] = True
+            matches &= in_range
+        
+        for column in ('brand', 'marketplace'):
+            if column in filters:
+                codes, lookup = index[column]
+                matches &= codes == lookup.get(filters[column], -1)
+        
+        if 'min_rating' in filters:
+            matches &= index['ratings'] >= filters['min_rating']
+        return matches
+    
+    def _build_recommendations(self, indices, similarities, preferences, k=None, ranks=None):
+        """Materialize product dicts and explanations only for the winners
+        
+        ranks are the 0-based relevance ranks of indices (default: in order);
+        the k nearest neighbours are flagged as the main recommendations.
+        """
+        k = k if k is not None else Config.KNN_K_VALUE
+        ranks = ranks if ranks is not None else range(len(indices))
         recommendations = []
-        for item in knn_recommendations:
+        for idx, content_score, rank in zip(indices, similarities, ranks):
             recommendation = {
-                'product': item['product'],
-                'content_similarity': item['content_similarity'],
-                'knn_distance': item['distance'],
-                'explanation': item['explanation']
+                'product': self._product_dict(idx),
+                'content_similarity': content_score,
+                'knn_distance': 1 - content_score,
+                'knn_rank': int(rank) + 1,
+                'is_neighbor': bool(rank < k),
+                'explanation': self._generate_explanation(content_score, preferences)
             }
             recommendations.append(recommendation)
         
         return recommendations
     
+    @property
+    def catalog_signature(self):
+        """Fingerprint of the catalog rows and fitted weights behind the rankings"""
+        if self._catalog_signature is None:
+            digest = hashlib.sha1()
+            active = np.flatnonzero(self.active_mask)
+            digest.update(np.ascontiguousarray(self._ids_at(active), dtype=np.int64).tobytes())
+            if 'updated_at' in self.products_df:
+                updated = self._timestamps_at(active)
+                digest.update(np.ascontiguousarray(updated.astype('datetime64[s]').astype(np.int64)).tobytes())
+            digest.update(np.ascontiguousarray(self.tfidf_vectorizer.idf_, dtype=np.float64).tobytes())
+            if self.hybrid_scoring:
+                digest.update(json.dumps(self.hybrid_weights, sort_keys=True).encode('utf-8'))
+            self._catalog_signature = digest.hexdigest()
+        return self._catalog_signature
+    
+    def enum_profiles(self):
+        """Every keyword-free preference profile allowed by the schema enums"""
+        fields = list(self.PREFERENCE_ENUMS)
+        for values in itertools.product(*(self.PREFERENCE_ENUMS[field] for field in fields)):
+            yield dict(zip(fields, values))
+    
+    def compute_precomputed_rows(self, top_n=None):
+        """Score every enum profile in chunked matrix products and keep the top N"""
+        top_n = top_n or Config.PRECOMPUTED_TOP_N
+        
+        rows = []
+        for profile, top_indices, similarities in self._score_batch(self.enum_profiles(), top_n):
+            rows.append({
+                **profile,
+                'product_ids': [int(pid) for pid in self._ids_at(top_indices)],
+                'scores': [float(score) for score in similarities]
+            })
+        return rows
+    
+    def get_recommendations_batch(self, preferences_list, max_recommendations=10, max_cells=None):
+        """Yield (preferences, recommendations) for many profiles
+        
+        Profiles are consumed lazily and scored a chunk at a time, so memory
+        stays bounded by max_cells similarity values regardless of user count.
+        Each profile is limited to its saved price band (rentang_harga).
+        """
+        if self.products_df is None:
+            if not self.load_products():
+                return
+        
+        for preferences, top_indices, similarities in self._score_batch(
+                preferences_list, max_recommendations, max_cells):
+            yield preferences, self._build_recommendations(
+                top_indices, similarities, preferences, preferences.get('k_value'))
+    
+    def _score_batch(self, profiles, top_n, max_cells=None):
+        """Yield (profile, top indices, similarities) scoring profiles in chunks"""
+        max_cells = max_cells or Config.BATCH_SCORE_MAX_CELLS
+        chunk_size = max(1, max_cells // max(len(self.active_mask), 1))
+        
+        profiles = iter(profiles)
+        while True:
+            chunk = list(itertools.islice(profiles, chunk_size))
+            if not chunk:
+                return
+            
+            # Group the chunk by price band so each group scores only its candidates
+            groups = {}
+            for row, profile in enumerate(chunk):
+                filter_key = self._filter_key(self.price_band_filters(profile.get('rentang_harga')))
+                groups.setdefault(filter_key, []).append(row)
+            
+            # One (profiles x candidates) similarity product per group
+            queries = self.tfidf_vectorizer.transform([self._profile_text(p) for p in chunk])
+            results = [None] * len(chunk)
+            for filter_key, rows in groups.items():
+                candidates = self._candidate_positions(filter_key)
+                similarities = self._similarities(queries[rows], candidates)
+                for row, similarity_row in zip(rows, similarities):
+                    results[row] = self._rank(similarity_row, top_n, candidates)
+            
+            for profile, (top_indices, top_similarities) in zip(chunk, results):
+                yield profile, top_indices, top_similarities
+    
+    def _is_keyword_free(self, preferences):
+        """Check whether a profile is fully described by the enum columns"""
+        if preferences.get('kata_kunci') or preferences.get('kata_kunci_preferensi'):
+            return False
+        return all(preferences.get(field) in values for field, values in self.PREFERENCE_ENUMS.items())
+    
+    def _precomputed_recommendations(self, preferences, max_recommendations, k=None):
+        """Serve a profile from the precomputed table, or None to score live"""
+        row = PrecomputedRecommendation.get(
+            preferences['kondisi_kulit'], preferences['masalah_kulit'],
+            preferences['preferensi_produk'], preferences['rentang_harga']
+        )
+        if not row or row['catalog_signature'] != self.catalog_signature:
+            return None
+        
+        product_ids = [int(pid) for pid in row['product_ids'].split(',') if pid]
+        scores = [float(score) for score in row['scores'].split(',') if score]
+        candidates = self._candidate_positions(
+            self._filter_key(self.price_band_filters(preferences['rentang_harga'])))
+        available = self.active_count if candidates is None else len(candidates)
+        if len(product_ids) < min(max_recommendations, available):
+            return None
+        
+        positions = self._positions_of(product_ids[:max_recommendations])
+        if positions is None:
+            return None
+        similarities = np.asarray(scores[:max_recommendations], dtype=np.float64)
+        return self._build_recommendations(positions, similarities, preferences, k)
+    
+    def _positions_of(self, product_ids):
+        """Row positions of active products by id, or None if any is missing"""
+        positions = self._lookup_positions(product_ids)
+        if (positions < 0).any():
+            return None
+        return positions
+    
+    def _lookup_positions(self, product_ids):
+        """Row positions of active products by id, -1 for ids not in the catalog"""
+        if self._id_order is None:
+            # The fitted rows are sorted by id once per fit, the delta's active rows per model
+            fitted = self._shared.get('id_order')
+            if fitted is None:
+                order = np.argsort(self.product_ids, kind='stable')
+                fitted = self._shared['id_order'] = (order, self.product_ids[order])
+            self._id_order = [fitted]
+            if self.delta is not None:
+                active = np.flatnonzero(self.active_mask[len(self.product_ids):])
+                order = len(self.product_ids) + active[np.argsort(self.delta.product_ids[active], kind='stable')]
+                self._id_order.append((order, self.delta.product_ids[order - len(self.product_ids)]))
+        
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        positions = np.full(len(product_ids), -1, dtype=np.intp)
+        for order, sorted_ids in self._id_order:
+            if len(sorted_ids):
+                found = np.minimum(np.searchsorted(sorted_ids, product_ids), len(sorted_ids) - 1)
+                hit = (sorted_ids[found] == product_ids) & self.active_mask[order[found]]
+                positions[hit] = order[found[hit]]
+        return positions
+    
+    @staticmethod
+    def _top_n_indices(distances, n):
+        """Return indices of the n smallest distances, ties broken by catalog order"""
+        total = len(distances)
+        if n <= 0 or total == 0:
+            return np.empty(0, dtype=np.intp)
+        
+        if n < total:
+            # Partition out the n smallest, then take rows tied with the boundary
+            # value in catalog order so the result matches a stable full sort
+            boundary = distances[np.argpartition(distances, n - 1)[n - 1]]
+            closer = np.flatnonzero(distances < boundary)
+            tied = np.flatnonzero(distances == boundary)[:n - len(closer)]
+            candidates = np.concatenate((closer, tied))
+        else:
+            candidates = np.arange(total)
+        
+        order = np.lexsort((candidates, distances[candidates]))
+        return candidates[order][:n]
+    
     def _generate_explanation(self, content_score, preferences):
         """Generate explanation for recommendation based on content similarity"""
         explanation_parts = []
@@ -202,4 +1454,232 @@ class SkincareRecommender:
         if 'masalah_kulit' in preferences and preferences['masalah_kulit']:
             explanation_parts.append(f"mengatasi {preferences['masalah_kulit']}")
         
-        return " - ".join(explanation_parts)
\ No newline at end of file
+        return " - ".join(explanation_parts)
+
+
+class RecommenderHolder:
+    """Process-wide holder publishing fully built, read-only recommender models"""
+    
+    def __init__(self, factory=SkincareRecommender):
+        self._factory = factory
+        self._model = None
+        self._version = 0
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._rebuild_requested = False
+        self._rebuild_running = False
+        self._sync_running = False
+        self._cache = LRUCache(Config.RECOMMENDATION_CACHE_SIZE, Config.RECOMMENDATION_CACHE_TTL)
+    
+    @property
+    def version(self):
+        """Version of the currently published model (0 before the first build)"""
+        return self._version
+    
+    def get(self):
+        """Return the current model, building it on first use"""
+        model = self._model
+        if model is None:
+            with self._build_lock:
+                if self._model is None:
+                    # Cold start: prefer the prebuilt memory-mapped artifacts
+                    self._publish(self._build(use_artifacts=True))
+                model = self._model
+            if model is not None:
+                self.start_sync()
+        return model
+    
+    def get_recommendations(self, preferences, max_recommendations=10, k_value=None, filters=None):
+        """Get recommendations from the current model snapshot"""
+        model = self.get()
+        if model is None:
+            return []
+        
+        # Users with the same profile share one cached result per model version
+        key = (model.version,) + model.cache_key(preferences, max_recommendations, k_value, filters)
+        recommendations = self._cache.get(key)
+        if recommendations is None:
+            recommendations = model.get_recommendations(preferences, max_recommendations, k_value, filters)
+            self._cache.set(key, recommendations)
+        
+        # Callers may re-sort the list, so hand out a copy
+        return list(recommendations)
+    
+    def get_recommendation_page(self, preferences, page=1, per_page=None, sort_by='score',
+                                k_value=None, filters=None):
+        """Get one sorted page of recommendations, ranking the profile once per model version"""
+        model = self.get()
+        if model is None:
+            return {'recommendations': [], 'page': 1, 'per_page': per_page or Config.RECOMMENDATIONS_PER_PAGE,
+                    'pages': 1, 'total': 0, 'sort_by': sort_by}
+        
+        # The ranked candidate set is shared by every page and sort order of the profile
+        limit = Config.RECOMMENDATION_CANDIDATE_LIMIT
+        key = (model.version, 'ranked') + model.cache_key(preferences, limit, k_value, filters)
+        ranked = self._cache.get(key)
+        if ranked is None:
+            # Unrelated products (no shared terms) are not listed
+            ranked = model.rank_candidates(preferences, limit, k_value, filters,
+                                           min_similarity=Config.RECOMMENDATION_MIN_SIMILARITY)
+            self._cache.set(key, ranked)
+        
+        return model.get_recommendation_page(ranked, preferences, sort_by, page, per_page, k_value)
+    
+    def search_products(self, query, page=1, per_page=20, sort_by='relevance', brand=None):
+        """Search the current model's product index (None when unavailable)"""
+        model = self.get()
+        if model is None:
+            return None
+        return model.search_products(query, page, per_page, sort_by, brand)
+    
+    def cache_stats(self):
+        """Get recommendation cache hit/miss counters"""
+        return self._cache.stats()
+    
+    def rebuild(self):
+        """Build a new model from the database and swap it in"""
+        model = self._build()
+        if model is None:
+            return False
+        with self._build_lock:
+            self._publish(model)
+        return True
+    
+    def apply_product_change(self, action, product_id):
+        """Patch the current model with a single product change"""
+        if self._model is None:
+            return
+        
+        product = Product.get_by_id(product_id) if action != 'delete' else None
+        self._patch([(action, product_id, product)])
+    
+    def sync_catalog(self):
+        """Apply products changed in the database since the model's updated_at watermark
+        
+        Edits from the importer or other app nodes are fetched as a delta;
+        deletions are detected from the row count. Returns the number of
+        product changes applied (or handed to a full rebuild).
+        """
+        model = self._model
+        watermark = model.catalog_watermark if model is not None else None
+        if watermark is None:
+            return 0
+        
+        state = Product.get_catalog_state()
+        if not state or state['last_updated'] is None:
+            return 0
+        if pd.Timestamp(state['last_updated']) <= watermark and state['total'] == model.active_count:
+            return 0
+        
+        # >= watermark: rows sharing the last second may not all have been seen
+        changed = model.stale_products(Product.get_changed_since(watermark.to_pydatetime()))
+        changes = [('update', product['id'], product) for product in changed]
+        
+        new_rows = int((model._lookup_positions([product['id'] for product in changed]) < 0).sum())
+        if state['total'] != model.active_count + new_rows:
+            current_ids = set(Product.get_all_ids())
+            changes += [('delete', int(product_id), None)
+                        for product_id in model._ids_at(np.flatnonzero(model.active_mask))
+                        if product_id not in current_ids]
+        
+        if not changes:
+            return 0
+        if self._needs_rebuild(len(changes)):
+            self.invalidate()
+        else:
+            self._patch(changes)
+        return len(changes)
+    
+    def start_sync(self, interval=None):
+        """Start the background delta sync thread (once per holder)"""
+        interval = Config.CATALOG_SYNC_INTERVAL if interval is None else interval
+        with self._state_lock:
+            if interval <= 0 or self._sync_running:
+                return
+            self._sync_running = True
+        threading.Thread(target=self._sync_worker, args=(interval,), daemon=True).start()
+    
+    def _sync_worker(self, interval):
+        """Poll the products table for changes until the process exits"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync_catalog()
+            except Exception as e:
+                print(f"Error syncing recommender catalog: {e}")
+    
+    def _needs_rebuild(self, change_count):
+        """Whether change_count row edits are better served by a full rebuild"""
+        return (change_count > Config.CATALOG_PATCH_MAX_CHANGES or
+                change_count > Config.TFIDF_REFIT_DRIFT_THRESHOLD * max(self._model.active_count, 1))
+    
+    def _patch(self, changes):
+        """Apply (action, product_id, product) edits to the current model in one copy and publish it"""
+        with self._build_lock:
+            model = self._model.with_product_changes(changes)
+            if model is not None and model is not self._model:
+                self._publish(model)
+        
+        with self._state_lock:
+            # A full rebuild already in flight may predate these changes
+            if self._rebuild_running:
+                self._rebuild_requested = True
+        
+        if model is None or model.vocabulary_drift() > Config.TFIDF_REFIT_DRIFT_THRESHOLD:
+            self.invalidate()
+    
+    def invalidate(self):
+        """Schedule a background rebuild; readers keep the current model meanwhile"""
+        with self._state_lock:
+            self._rebuild_requested = True
+            if self._rebuild_running:
+                return
+            self._rebuild_running = True
+        threading.Thread(target=self._rebuild_worker, daemon=True).start()
+    
+    def _rebuild_worker(self):
+        """Rebuild until no further invalidations arrived during the last build"""
+        while True:
+            with self._state_lock:
+                if not self._rebuild_requested:
+                    self._rebuild_running = False
+                    return
+                self._rebuild_requested = False
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"Error rebuilding recommender: {e}")
+    
+    def _build(self, use_artifacts=False):
+        """Build a complete model outside of any reader path"""
+        model = self._factory()
+        if not model.load_products(use_artifacts=use_artifacts):
+            return None
+        if model.knn_algorithm != 'brute' and not model.hybrid_scoring:
+            model._get_knn_index()
+        return model
+    
+    def _publish(self, model):
+        """Atomically replace the current model (caller holds the build lock)"""
+        if model is None:
+            return
+        self._version += 1
+        model.version = self._version
+        # A single reference assignment: readers see either the old or new model
+        self._model = model
+        self._cache.clear()
+
+
+# Shared across all routes of this process
+shared_recommender = RecommenderHolder()
+
+
+def _on_product_change(action, product_id):
+    """Update the shared model after admin catalog edits"""
+    if product_id is None:
+        shared_recommender.invalidate()
+    else:
+        shared_recommender.apply_product_change(action, product_id)
+
+
+Product.add_change_listener(_on_product_change)
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+class ProductSearchIndex:
+    """Inverted index over cleaned product text, ranked with BM25
+    
+    Rows hold per-product term counts of the recommender's cleaned
+    name/brand/description text. A query term matches products containing
+    it, or any term it prefixes ('garn' finds 'garnier'); products must
+    match every term. Scores sum BM25 over the matched terms.
+    
+    Rows added after the build go to a small appended matrix; the built
+    matrix and the arrays derived from it are shared by every index
+    extended from it, so adding rows never copies them. Rows replaced by
+    appended ones no longer count toward the corpus statistics.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    TOKEN_PATTERN = r'[a-z]+'  # Cleaned text is lowercase letters and spaces
+    FILES = ('search_data', 'search_indices', 'search_indptr')
+    
+    def __init__(self, matrix, vocabulary, appended=None, shared=None, replaced=None):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.vocabulary = vocabulary
+        self.appended = appended
+        self.replaced = np.empty(0, dtype=np.intp) if replaced is None else replaced
+        if shared is None:
+            shared = {'doc_lengths': np.asarray(self.matrix.sum(axis=1), dtype=np.float32).ravel(), 'postings': None}
+        self._shared = shared
+        self._appended_postings = None
+        self._sorted_terms = None
+    
+    @classmethod
+    def build(cls, texts):
+        """Index an iterable of cleaned product texts, one row per product"""
+        vectorizer = CountVectorizer(token_pattern=cls.TOKEN_PATTERN, dtype=np.float32)
+        try:
+            matrix = vectorizer.fit_transform(texts)
+        except ValueError:
+            # No terms at all (empty catalog or blank texts)
+            return cls(sparse.csr_matrix((len(texts), 0), dtype=np.float32), {})
+        return cls(matrix, {term: int(column) for term, column in vectorizer.vocabulary_.items()})
+    
+    def __len__(self):
+        return self.matrix.shape[0] + (self.appended.shape[0] if self.appended is not None else 0)
+    
+    def with_rows(self, texts, replaced=()):
+        """Return a new index with rows for texts appended after this index's rows
+        
+        replaced lists the positions of rows the new ones supersede.
+        """
+        vocabulary = self.vocabulary
+        token_rows = [re.findall(self.TOKEN_PATTERN, text.lower()) for text in texts]
+        new_terms = sorted(set(token for tokens in token_rows for token in tokens if token not in vocabulary))
+        if new_terms:
+            vocabulary = dict(vocabulary)
+            for term in new_terms:
+                vocabulary[term] = len(vocabulary)
+        
+        data, indices, indptr = [], [], [0]
+        for tokens in token_rows:
+            counts = Counter(vocabulary[token] for token in tokens)
+            columns = sorted(counts)
+            data.extend(counts[column] for column in columns)
+            indices.extend(columns)
+            indptr.append(len(indices))
+        rows = sparse.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr)),
+            shape=(len(texts), len(vocabulary))
+        )
+        if self.appended is not None:
+            rows = sparse.vstack([self._widened(self.appended, len(vocabulary)), rows], format='csr')
+        
+        replaced = np.union1d(self.replaced, np.asarray(replaced, dtype=np.intp))
+        index = ProductSearchIndex(self.matrix, vocabulary, rows, self._shared, replaced)
+        if not new_terms:
+            index._sorted_terms = self._sorted_terms
+        return index
+    
+    def full_matrix(self):
+        """All rows, built and appended, as one matrix over the whole vocabulary"""
+        if self.appended is None:
+            return self.matrix
+        width = len(self.vocabulary)
+        return sparse.vstack([self._widened(self.matrix, width), self._widened(self.appended, width)], format='csr')
+    
+    @staticmethod
+    def _widened(matrix, width):
+        """matrix with extra empty columns up to width (no copy of its arrays)"""
+        if matrix.shape[1] >= width:
+            return matrix
+        return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width))
+    
+    def save(self, directory):
+        """Write the index arrays and vocabulary into an artifact directory"""
+        matrix = self.full_matrix()
+        for name, array in zip(self.FILES, (matrix.data, matrix.indices, matrix.indptr)):
+            np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(array))
+        with open(os.path.join(directory, 'search_vocabulary.json'), 'w', encoding='utf-8') as file:
+            json.dump(self.vocabulary, file)
+    
+    @classmethod
+    def load(cls, directory):
+        """Open a saved index with memory-mapped arrays, or None if the build has none"""
+        try:
+            with open(os.path.join(directory, 'search_vocabulary.json'), encoding='utf-8') as file:
+                vocabulary = json.load(file)
+            data, indices, indptr = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                                     for name in cls.FILES]
+        except (OSError, ValueError):
+            return None
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(vocabulary)), copy=False)
+        return cls(matrix, vocabulary)
+    
+    def search(self, terms, mask=None):
+        """Return (positions, scores) of rows matching every term, best BM25 score first"""
+        n_rows = len(self)
+        terms = list(dict.fromkeys(term for term in terms if term))
+        if not terms or n_rows == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        
+        segments = self._get_postings()
+        doc_lengths = self._shared['doc_lengths']
+        if self.appended is not None:
+            doc_lengths = np.concatenate([doc_lengths, np.asarray(self.appended.sum(axis=1), dtype=np.float32).ravel()])
+        live = np.ones(n_rows, dtype=bool)
+        live[self.replaced] = False
+        live_rows = n_rows - len(self.replaced)
+        average_length = (doc_lengths[live].mean() if live_rows else 0) or 1.0
+        length_norm = self.K1 * (1 - self.B + self.B * doc_lengths / average_length)
+        
+        scores = np.zeros(n_rows, dtype=np.float32)
+        matched = np.ones(n_rows, dtype=bool) if mask is None else np.asarray(mask, dtype=bool).copy()
+        for term in terms:
+            columns = self._term_columns(term)
+            if len(columns) == 0:
+                return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+            
+            # Postings of the matching columns in each segment (new terms only exist in appended rows)
+            doc_freq = np.zeros(len(columns), dtype=np.int64)
+            parts = []
+            for postings, first_row in segments:
+                inside = columns < postings.shape[1]
+                term_postings = postings[:, columns[inside]]
+                counts = np.diff(term_postings.indptr)
+                rows = term_postings.indices + first_row
+                live_postings = np.concatenate([[0], np.cumsum(live[rows])])
+                doc_freq[inside] += live_postings[term_postings.indptr[1:]] - live_postings[term_postings.indptr[:-1]]
+                parts.append((inside, counts, rows, term_postings.data))
+            
+            idf = np.log(1 + (live_rows - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+            hits = np.zeros(n_rows, dtype=bool)
+            for inside, counts, rows, tf in parts:
+                weights = np.repeat(idf[inside], counts) * tf * (self.K1 + 1) / (tf + length_norm[rows])
+                scores += np.bincount(rows, weights=weights, minlength=n_rows).astype(np.float32)
+                hits[rows] = True
+            matched &= hits
+        
+        positions = np.flatnonzero(matched)
+        order = np.lexsort((positions, -scores[positions]))
+        return positions[order], scores[positions[order]]
+    
+    def _get_postings(self):
+        """Lazily build term-major (CSC) copies: [(postings, first row)] per segment"""
+        if self._shared['postings'] is None:
+            self._shared['postings'] = self.matrix.tocsc()
+        segments = [(self._shared['postings'], 0)]
+        if self.appended is not None:
+            if self._appended_postings is None:
+                self._appended_postings = self.appended.tocsc()
+            segments.append((self._appended_postings, self.matrix.shape[0]))
+        return segments
+    
+    def _term_columns(self, term):
+        """Columns of the vocabulary terms starting with term"""
+        if self._sorted_terms is None:
+            terms = np.array(sorted(self.vocabulary), dtype=str)
+            self._sorted_terms = (terms, np.array([self.vocabulary[t] for t in terms], dtype=np.int64))
+        terms, columns = self._sorted_terms
+        low = np.searchsorted(terms, term, 'left')
+        high = np.searchsorted(terms, term + '\uffff', 'left')
+        return columns[low:high]
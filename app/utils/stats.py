@@ -0,0 +1,106 @@
+import threading
+import time
+from datetime import date
+from functools import partial
+
+from app.config.config import Config, DatabaseConfig
+
+class DashboardStats:
+    """Live counters behind the admin dashboard
+    
+    Model writes adjust the counters in place, so reading them costs no
+    query. A background thread recounts the tables every
+    STATS_RECONCILE_INTERVAL seconds to correct drift from writes made
+    elsewhere (the importer, other worker processes). Daily counters reset
+    when the date changes.
+    """
+    
+    # Counter -> query recounting it during reconciliation
+    RECONCILE_QUERIES = {
+        'total_users': "SELECT COUNT(*) as total FROM users",
+        'new_users_today': "SELECT COUNT(*) as total FROM users WHERE created_at >= CURDATE()",
+        'total_products': "SELECT COUNT(*) as total FROM products",
+        'total_preferences': "SELECT COUNT(*) as total FROM user_preferences",
+        'total_recommendations': "SELECT COUNT(*) as total FROM recommendations",
+        'recommendations_today': "SELECT COUNT(*) as total FROM recommendations WHERE created_at >= CURDATE()"
+    }
+    DAILY_COUNTERS = ('new_users_today', 'recommendations_today')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.RECONCILE_QUERIES, 0)
+        self._day = date.today()
+        self._reconciled_at = None
+        self._reconcile_running = False
+    
+    def increment(self, name, amount=1):
+        """Adjust a counter after a write"""
+        with self._lock:
+            self._roll_day()
+            self._counters[name] += amount
+    
+    def record_signup(self):
+        """Count a newly registered user"""
+        with self._lock:
+            self._roll_day()
+            self._counters['total_users'] += 1
+            self._counters['new_users_today'] += 1
+    
+    def record_served(self, count):
+        """Count recommendations shown to a user"""
+        with self._lock:
+            self._roll_day()
+            self._counters['total_recommendations'] += count
+            self._counters['recommendations_today'] += count
+    
+    def snapshot(self):
+        """Get a copy of all counters, counting the tables on first use"""
+        if self._reconciled_at is None:
+            self.reconcile()
+        self.start_reconciler()
+        with self._lock:
+            self._roll_day()
+            return dict(self._counters)
+    
+    def reconcile(self):
+        """Replace the table counters with fresh counts (failed counts keep the live value)"""
+        names = list(self.RECONCILE_QUERIES)
+        results = DatabaseConfig.gather(*[
+            partial(DatabaseConfig.execute_query, self.RECONCILE_QUERIES[name], fetch=True) for name in names
+        ])
+        with self._lock:
+            self._roll_day()
+            for name, result in zip(names, results):
+                if result:
+                    self._counters[name] = result[0]['total']
+            self._reconciled_at = time.time()
+    
+    def start_reconciler(self, interval=None):
+        """Start the background reconciliation thread (once per process)"""
+        interval = Config.STATS_RECONCILE_INTERVAL if interval is None else interval
+        with self._lock:
+            if interval <= 0 or self._reconcile_running:
+                return
+            self._reconcile_running = True
+        threading.Thread(target=self._reconcile_worker, args=(interval,), daemon=True).start()
+    
+    def _reconcile_worker(self, interval):
+        """Recount the tables until the process exits"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Error reconciling dashboard stats: {e}")
+    
+    def _roll_day(self):
+        """Reset the daily counters once the date changes (caller holds the lock)"""
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            for name in self.DAILY_COUNTERS:
+                self._counters[name] = 0
+
+
+# Shared across all routes of this process
+dashboard_stats = DashboardStats()
@@ -0,0 +1,13 @@
+USE skincare_db;
+-- Composite (sort column, id) indexes for keyset pagination of the admin product listing.
+-- The brand-leading ones serve the brand filter and replace idx_brand, idx_harga and idx_rating.
+ALTER TABLE products
+    ADD INDEX idx_rating_id (rating_bintang, id),
+    ADD INDEX idx_harga_id (harga, id),
+    ADD INDEX idx_nama_id (nama_produk, id),
+    ADD INDEX idx_brand_rating_id (brand, rating_bintang, id),
+    ADD INDEX idx_brand_harga_id (brand, harga, id),
+    ADD INDEX idx_brand_nama_id (brand, nama_produk, id),
+    DROP INDEX idx_brand,
+    DROP INDEX idx_harga,
+    DROP INDEX idx_rating;
@@ -0,0 +1,12 @@
+USE skincare_db;
+CREATE TABLE IF NOT EXISTS precomputed_recommendations (
+    kondisi_kulit ENUM('berminyak', 'kering', 'kombinasi', 'sensitif', 'normal') NOT NULL,
+    masalah_kulit ENUM('jerawat', 'komedo', 'kusam', 'kerutan', 'flek_hitam', 'pori_besar') NOT NULL,
+    preferensi_produk ENUM('cleanser', 'moisturizer', 'serum', 'sunscreen', 'toner', 'semua') NOT NULL,
+    rentang_harga ENUM('0-50000', '50000-100000', '100000-200000', '200000-500000', '500000+') NOT NULL,
+    catalog_signature CHAR(40) NOT NULL,
+    product_ids TEXT NOT NULL,
+    scores TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (kondisi_kulit, masalah_kulit, preferensi_produk, rentang_harga)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,23 @@
+USE skincare_db;
+ALTER TABLE products
+    ADD COLUMN source_key CHAR(40) NULL AFTER deskripsi_produk,
+    ADD COLUMN content_hash CHAR(40) NULL AFTER source_key,
+    ADD UNIQUE KEY uq_source_key (source_key);
+-- Backfill keys of existing rows so the first sync (import_dataset.py --sync) keeps their ids.
+-- Of rows sharing a link only the newest gets the key; older repeats stay keyless, which the
+-- sync leaves alone like products added through the admin panel
+UPDATE products
+JOIN (
+    SELECT MAX(id) AS id FROM products
+    GROUP BY SHA1(IF(link_produk <> '', link_produk, CONCAT('no_urut:', no_urut)))
+) newest ON newest.id = products.id
+SET products.source_key = SHA1(IF(products.link_produk <> '', products.link_produk,
+                                  CONCAT('no_urut:', products.no_urut)))
+WHERE products.source_key IS NULL;
+-- Backfill content hashes the same way (DatasetImporter.content_hash over the stored columns),
+-- so rows that did not change are not rewritten by the first sync
+UPDATE products SET content_hash = SHA1(CONCAT_WS(CHAR(31 USING utf8mb4),
+    COALESCE(no_urut, ''), nama_produk, brand, COALESCE(terjual, ''), COALESCE(reviews, ''),
+    COALESCE(rating_bintang, ''), COALESCE(marketplace, ''), COALESCE(link_produk, ''), harga,
+    COALESCE(deskripsi_produk, '')))
+WHERE source_key IS NOT NULL AND content_hash IS NULL;
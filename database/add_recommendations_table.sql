@@ -0,0 +1,15 @@
+USE skincare_db;
+-- Log of served recommendations, filled in batches by app/utils/recommendation_log.py
+CREATE TABLE IF NOT EXISTS recommendations (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,  -- No foreign key: the log outlives products removed by the importer
+    score DECIMAL(5,3),
+    reason TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_product (user_id, product_id),
+    INDEX idx_score (score),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,4 @@
+USE skincare_db;
+-- Index for the recommender's delta sync, which polls MAX(updated_at) and reads rows with
+-- updated_at >= its watermark every CATALOG_SYNC_INTERVAL seconds
+ALTER TABLE products ADD INDEX idx_updated_at (updated_at);
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Batch Recommendation Script for Skincare Recommendation System
+Computes recommendations for every saved user preference (digests, dashboards)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config.config import Config
+from app.models.models import UserPreference
+from app.utils.recommender import SkincareRecommender
+
+def main():
+    """Main function to run the batch job"""
+    parser = argparse.ArgumentParser(description='Compute recommendations for all users')
+    parser.add_argument('--top-n', type=int, default=Config.MAX_RECOMMENDATIONS,
+                        help='Recommendations per user (default: MAX_RECOMMENDATIONS)')
+    parser.add_argument('--output', help='JSON Lines output file (default: stdout)')
+    args = parser.parse_args()
+
+    # Progress goes to stderr so stdout can carry the JSON Lines output
+    log = sys.stderr
+
+    print("🚀 Batch Recommendations", file=log)
+    print("=" * 50, file=log)
+
+    recommender = SkincareRecommender()
+    if not recommender.load_products(use_artifacts=True):
+        print("❌ No products found in database", file=log)
+        return False
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    users = 0
+    try:
+        for preferences, recommendations in recommender.get_recommendations_batch(
+                UserPreference.iter_all(), args.top_n):
+            record = {
+                'user_id': preferences['user_id'],
+                'username': preferences.get('username'),
+                'recommendations': [
+                    {
+                        'product_id': int(item['product']['id']),
+                        'name': item['product']['name'],
+                        'score': round(float(item['content_similarity']), 4)
+                    }
+                    for item in recommendations
+                ]
+            }
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            users += 1
+            if users % 1000 == 0:
+                print(f"📥 {users} users processed...", file=log)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"✅ Recommendations computed for {users} users in {time.perf_counter() - start:.2f}s", file=log)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 """
 Dataset Import Script for Skincare Recommendation System
-Imports Skincare_Dataset.csv into MySQL database
+Imports Skincare_Dataset.csv (or larger marketplace dumps) into MySQL database
 """
 
+import argparse
 import pandas as pd
 import mysql.connector
 from mysql.connector import Error
-import re
+from concurrent.futures import ProcessPoolExecutor
+from queue import Full
+import multiprocessing
+import hashlib
+import json
 import os
 import sys
+import time
 
 # Add parent directory to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -18,6 +24,32 @@ from app.config.config import DatabaseConfig
 class DatasetImporter:
     """Import CSV dataset to MySQL database"""
     
+    # Rows read and cleaned at a time, and rows sent per executemany
+    CHUNK_ROWS = 10000
+    INSERT_BATCH_ROWS = 1000
+    
+    # Map CSV columns to database columns
+    COLUMN_MAPPING = {
+        'no.': 'no_urut',
+        'nama produk': 'nama_produk',
+        'merk': 'brand',
+        'terjual': 'terjual',
+        'reviews': 'reviews',
+        'bintang': 'rating_bintang',
+        'marketplace': 'marketplace',
+        'link': 'link_produk',
+        'harga': 'harga',
+        'deskripsi produk': 'deskripsi_produk'
+    }
+    
+    # Database column -> maximum stored length (None = unlimited)
+    INSERT_COLUMNS = (
+        ('no_urut', None), ('nama_produk', 255), ('brand', 100), ('terjual', 50), ('reviews', 50),
+        ('rating_bintang', None), ('marketplace', 50), ('link_produk', None), ('harga', None),
+        ('deskripsi_produk', None)
+    )
+    INSERT_COLUMN_NAMES = tuple(column for column, _ in INSERT_COLUMNS) + ('source_key', 'content_hash')
+    
     def __init__(self, csv_file_path):
         self.csv_file_path = csv_file_path
         self.connection = None
@@ -36,106 +68,60 @@ class DatasetImporter:
             print(f"❌ Database connection error: {e}")
             return False
     
-    def clean_numeric_value(self, value):
-        """Clean numeric values from CSV (remove commas, plus signs, etc.)"""
-        if pd.isna(value) or value == '':
-            return 0
-        
-        # Convert to string and clean
-        value_str = str(value).strip()
-        
-        # Remove common formatting
-        value_str = value_str.replace(',', '')  # Remove commas
-        value_str = value_str.replace('+', '')  # Remove plus signs
-        value_str = value_str.replace('++', '') # Remove double plus
-        value_str = value_str.replace('Rp', '') # Remove currency
-        value_str = value_str.replace('.', '')  # Remove dots
-        
-        # Extract numbers only
-        numbers = re.findall(r'\d+', value_str)
-        if numbers:
-            return int(numbers[0])
-        
-        return 0
+    def clean_numeric_value(self, values):
+        """Clean numeric values from CSV (remove commas, plus signs, etc.), first number or 0"""
+        values = values.astype(str).str.replace(r'Rp|[,+.]', '', regex=True)
+        return self._first_number(values)
+    
+    def clean_price(self, values):
+        """Clean price strings and convert to integers"""
+        values = values.astype(str).str.replace(r'Rp|[,.]', '', regex=True)
+        return self._first_number(values)
+    
+    def clean_rating(self, values):
+        """Clean rating strings and convert to floats (0.0 when unparseable)"""
+        return pd.to_numeric(values.astype(str).str.strip(), errors='coerce').fillna(0.0).astype(float)
+    
+    def _first_number(self, values):
+        """First run of digits in each string, 0 when there is none"""
+        numbers = values.str.extract(r'(\d+)', expand=False)
+        return pd.to_numeric(numbers, errors='coerce').fillna(0).astype('int64')
     
-    def clean_price(self, price_str):
-        """Clean price string and convert to integer"""
-        if pd.isna(price_str) or price_str == '':
-            return 0
+    def clean_chunk(self, df):
+        """Clean one chunk of raw CSV rows with vectorized string operations"""
+        # Clean column names (remove spaces, standardize)
+        df.columns = df.columns.str.strip()
+        df = df.rename(columns=self.COLUMN_MAPPING)
         
-        # Remove currency symbols and formatting
-        price_clean = str(price_str).replace('Rp', '').replace(',', '').replace('.', '').strip()
+        # Clean numeric fields
+        df['no_urut'] = self.clean_numeric_value(df['no_urut'])
+        df['terjual'] = df['terjual'].astype(str)  # Keep as string for display
+        df['reviews'] = df['reviews'].astype(str)  # Keep as string for display
+        df['rating_bintang'] = self.clean_rating(df['rating_bintang'])
+        df['harga'] = self.clean_price(df['harga'])
         
-        # Extract numbers
-        numbers = re.findall(r'\d+', price_clean)
-        if numbers:
-            return int(numbers[0])
+        # Clean text fields
+        for column in ('nama_produk', 'brand', 'marketplace', 'link_produk', 'deskripsi_produk'):
+            df[column] = df[column].fillna('').astype(str).str.strip()
         
-        return 0
+        # Remove rows with empty essential fields
+        return df[(df['nama_produk'] != '') & (df['brand'] != '') & (df['harga'] > 0)]
     
-    def clean_rating(self, rating_str):
-        """Clean rating string and convert to float"""
-        if pd.isna(rating_str) or rating_str == '':
-            return 0.0
-        
-        try:
-            return float(str(rating_str).strip())
-        except ValueError:
-            return 0.0
+    def iter_clean_chunks(self, chunk_size=None):
+        """Read the CSV a chunk at a time and yield cleaned chunks"""
+        reader = pd.read_csv(self.csv_file_path, encoding='utf-8', chunksize=chunk_size or self.CHUNK_ROWS)
+        for chunk in reader:
+            yield self.clean_chunk(chunk)
     
     def load_and_clean_data(self):
         """Load CSV data and clean it"""
         try:
             print(f"📂 Loading dataset from: {self.csv_file_path}")
             
-            # Read CSV file
-            df = pd.read_csv(self.csv_file_path, encoding='utf-8')
-            print(f"📊 Loaded {len(df)} records from CSV")
-            
-            # Display column names
-            print("📋 CSV Columns:", list(df.columns))
-            
-            # Clean column names (remove spaces, standardize)
-            df.columns = df.columns.str.strip()
-            
-            # Map CSV columns to database columns
-            column_mapping = {
-                'no.': 'no_urut',
-                'nama produk': 'nama_produk',
-                'merk': 'brand',
-                'terjual': 'terjual',
-                'reviews': 'reviews',
-                'bintang': 'rating_bintang',
-                'marketplace': 'marketplace',
-                'link': 'link_produk',
-                'harga': 'harga',
-                'deskripsi produk': 'deskripsi_produk'
-            }
-            
-            # Rename columns
-            df = df.rename(columns=column_mapping)
-            
             # Clean data
             print("🧹 Cleaning data...")
-            
-            # Clean numeric fields
-            df['no_urut'] = df['no_urut'].apply(self.clean_numeric_value)
-            df['terjual'] = df['terjual'].astype(str)  # Keep as string for display
-            df['reviews'] = df['reviews'].astype(str)  # Keep as string for display
-            df['rating_bintang'] = df['rating_bintang'].apply(self.clean_rating)
-            df['harga'] = df['harga'].apply(self.clean_price)
-            
-            # Clean text fields
-            df['nama_produk'] = df['nama_produk'].fillna('').astype(str).str.strip()
-            df['brand'] = df['brand'].fillna('').astype(str).str.strip()
-            df['marketplace'] = df['marketplace'].fillna('').astype(str).str.strip()
-            df['link_produk'] = df['link_produk'].fillna('').astype(str).str.strip()
-            df['deskripsi_produk'] = df['deskripsi_produk'].fillna('').astype(str).str.strip()
-            
-            # Remove rows with empty essential fields
-            df = df[df['nama_produk'] != '']
-            df = df[df['brand'] != '']
-            df = df[df['harga'] > 0]
+            chunks = list(self.iter_clean_chunks())
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
             
             print(f"✅ Data cleaned. {len(df)} valid records ready for import")
             return df
@@ -144,47 +130,130 @@ class DatasetImporter:
             print(f"❌ Error loading/cleaning data: {e}")
             return None
     
-    def import_data(self, df):
-        """Import cleaned data to database"""
+    @classmethod
+    def iter_clean_files(cls, csv_files, workers=1, chunk_size=None):
+        """Yield cleaned chunks of several CSV files, cleaned in parallel processes
+        
+        Each worker streams one file; a bounded queue keeps at most a few
+        cleaned chunks per worker in memory, whatever the file sizes. When
+        the consumer stops early (or a worker fails), the others are told to
+        stop instead of waiting forever on the full queue.
+        """
+        if workers <= 1 or len(csv_files) <= 1:
+            for csv_file in csv_files:
+                yield from cls(csv_file).iter_clean_chunks(chunk_size)
+            return
+        
+        workers = min(workers, len(csv_files))
+        with multiprocessing.Manager() as manager:
+            queue = manager.Queue(maxsize=workers * 2)
+            stop = manager.Event()
+            executor = ProcessPoolExecutor(max_workers=workers)
+            try:
+                for csv_file in csv_files:
+                    executor.submit(_clean_file_worker, csv_file, chunk_size, queue, stop)
+                
+                remaining = len(csv_files)
+                while remaining:
+                    csv_file, chunk = queue.get()
+                    if chunk is None:
+                        remaining -= 1
+                    elif isinstance(chunk, Exception):
+                        raise RuntimeError(f"Cleaning {csv_file} failed: {chunk}")
+                    else:
+                        yield chunk
+            finally:
+                stop.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _chunk_rows(self, df):
+        """Insert tuples for a cleaned chunk (INSERT_COLUMN_NAMES order), text cut to the column lengths"""
+        columns = []
+        for column, max_length in self.INSERT_COLUMNS:
+            values = df[column]
+            if max_length is not None:
+                values = values.str[:max_length]
+            columns.append(values.tolist())
+        
+        keys = [self.source_key(link, no_urut) for link, no_urut in zip(df['link_produk'], df['no_urut'])]
+        return [values + (key, self.content_hash(values)) for values, key in zip(zip(*columns), keys)]
+    
+    @staticmethod
+    def source_key(link_produk, no_urut):
+        """Stable identity of a dataset row: SHA-1 of link_produk, or of no_urut without a link"""
+        key = link_produk if link_produk else f'no_urut:{no_urut}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def content_hash(values):
+        """SHA-1 over the stored column values of one row"""
+        return hashlib.sha1('\x1f'.join(str(value) for value in values).encode('utf-8')).hexdigest()
+    
+    def _insert_query(self, upsert=False):
+        """INSERT statement for INSERT_COLUMN_NAMES, optionally updating rows whose source_key exists"""
+        query = (f"INSERT INTO products ({', '.join(self.INSERT_COLUMN_NAMES)}) "
+                 f"VALUES ({', '.join(['%s'] * len(self.INSERT_COLUMN_NAMES))})")
+        if upsert:
+            updates = [f"{column} = VALUES({column})" for column in self.INSERT_COLUMN_NAMES if column != 'source_key']
+            query += f" ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+        return query
+    
+    def has_sync_columns(self):
+        """Check that products has the source_key and content_hash columns (add_product_sync_columns.sql)"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'products' "
+                "AND COLUMN_NAME IN ('source_key', 'content_hash')")
+            return cursor.fetchone()[0] == 2
+        finally:
+            cursor.close()
+    
+    def import_data(self, chunks, batch_size=None):
+        """Import cleaned chunks (or one cleaned DataFrame) to the database
+        
+        Rows are sent in batches of batch_size inside one transaction, so a
+        failure leaves the products table empty rather than half imported.
+        Rows repeating a source_key (the same link in several dumps) update
+        the earlier row: the last one wins, as in sync_data.
+        """
         if not self.connection:
             print("❌ No database connection")
             return False
         
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        batch_size = batch_size or self.INSERT_BATCH_ROWS
+        
+        cursor = None
         try:
+            # Checked before anything is deleted: the insert needs both columns
+            if not self.has_sync_columns():
+                print("❌ products has no source_key/content_hash columns, "
+                      "run database/add_product_sync_columns.sql first")
+                return False
+            
             cursor = self.connection.cursor()
             
-            # Clear existing data
+            # Clear existing data (ALTER TABLE commits implicitly, so this precedes the import transaction)
             print("🗑️ Clearing existing products...")
             cursor.execute("DELETE FROM products")
             cursor.execute("ALTER TABLE products AUTO_INCREMENT = 1")
             
-            # Prepare insert query
-            insert_query = """
-                INSERT INTO products (no_urut, nama_produk, brand, terjual, reviews, 
-                                    rating_bintang, marketplace, link_produk, harga, deskripsi_produk)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            # Convert DataFrame to list of tuples
-            data_tuples = []
-            for _, row in df.iterrows():
-                data_tuple = (
-                    int(row['no_urut']),
-                    row['nama_produk'][:255],  # Limit length
-                    row['brand'][:100],        # Limit length
-                    row['terjual'][:50],       # Limit length
-                    row['reviews'][:50],       # Limit length
-                    float(row['rating_bintang']),
-                    row['marketplace'][:50],   # Limit length
-                    row['link_produk'],
-                    int(row['harga']),
-                    row['deskripsi_produk']
-                )
-                data_tuples.append(data_tuple)
+            # Prepare insert query (upsert: source_key is unique)
+            insert_query = self._insert_query(upsert=True)
             
-            # Batch insert
-            print(f"📥 Importing {len(data_tuples)} products...")
-            cursor.executemany(insert_query, data_tuples)
+            self.connection.start_transaction()
+            start = time.perf_counter()
+            imported = 0
+            for chunk in chunks:
+                rows = self._chunk_rows(chunk)
+                for offset in range(0, len(rows), batch_size):
+                    cursor.executemany(insert_query, rows[offset:offset + batch_size])
+                imported += len(rows)
+                elapsed = time.perf_counter() - start
+                print(f"📥 {imported} products imported ({imported / max(elapsed, 1e-9):.0f} rows/s)")
             
             # Commit changes
             self.connection.commit()
@@ -213,43 +282,192 @@ class DatasetImporter:
             if cursor:
                 cursor.close()
     
+    def sync_data(self, chunks, batch_size=None, delete_missing=True):
+        """Upsert cleaned chunks by source_key, writing only rows whose content changed
+        
+        Product ids of unchanged and updated rows are kept. Returns the
+        changeset {'inserted', 'updated', 'deleted': product ids,
+        'unchanged': row count}, or None when the sync was rolled back.
+        """
+        if not self.connection:
+            print("❌ No database connection")
+            return None
+        
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        batch_size = batch_size or self.INSERT_BATCH_ROWS
+        
+        cursor = None
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT id, source_key, content_hash FROM products")
+            # Products added through the admin panel have no source key and are left alone
+            existing = {key: (product_id, content_hash)
+                        for product_id, key, content_hash in cursor.fetchall() if key is not None}
+            print(f"🔎 {len(existing)} products in database")
+            
+            upsert_query = self._insert_query(upsert=True)
+            self.connection.start_transaction()
+            start = time.perf_counter()
+            written = {}
+            inserted_keys = []
+            updated_keys = set()
+            updated_ids = []
+            unchanged = 0
+            processed = 0
+            for chunk in chunks:
+                pending = []
+                for row in self._chunk_rows(chunk):
+                    key, content_hash = row[-2], row[-1]
+                    if key in written:
+                        # Repeated key in the dump: the last row wins
+                        if written[key] != content_hash:
+                            pending.append(row)
+                            written[key] = content_hash
+                            current = existing.get(key)
+                            if current is not None and key not in updated_keys:
+                                # The first row matched the database, this one does not
+                                updated_keys.add(key)
+                                updated_ids.append(current[0])
+                                unchanged -= 1
+                        continue
+                    
+                    written[key] = content_hash
+                    current = existing.get(key)
+                    if current is None:
+                        inserted_keys.append(key)
+                        pending.append(row)
+                    elif current[1] != content_hash:
+                        updated_keys.add(key)
+                        updated_ids.append(current[0])
+                        pending.append(row)
+                    else:
+                        unchanged += 1
+                
+                for offset in range(0, len(pending), batch_size):
+                    cursor.executemany(upsert_query, pending[offset:offset + batch_size])
+                processed += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"📥 {processed} rows compared, {len(inserted_keys)} new, {len(updated_ids)} changed "
+                      f"({processed / max(elapsed, 1e-9):.0f} rows/s)")
+            
+            missing_ids = []
+            if delete_missing:
+                missing_ids = [product_id for key, (product_id, _) in existing.items() if key not in written]
+            for offset in range(0, len(missing_ids), batch_size):
+                batch = missing_ids[offset:offset + batch_size]
+                cursor.execute(f"DELETE FROM products WHERE id IN ({', '.join(['%s'] * len(batch))})", batch)
+            
+            # Look up the ids assigned to new rows
+            inserted_ids = []
+            for offset in range(0, len(inserted_keys), batch_size):
+                batch = inserted_keys[offset:offset + batch_size]
+                cursor.execute(
+                    f"SELECT id FROM products WHERE source_key IN ({', '.join(['%s'] * len(batch))})", batch)
+                inserted_ids.extend(row[0] for row in cursor.fetchall())
+            
+            # Commit changes
+            self.connection.commit()
+            
+            changeset = {
+                'inserted': sorted(inserted_ids),
+                'updated': sorted(updated_ids),
+                'deleted': sorted(missing_ids),
+                'unchanged': unchanged
+            }
+            print(f"✅ Sync complete: {len(inserted_ids)} inserted, {len(updated_ids)} updated, "
+                  f"{len(missing_ids)} deleted, {unchanged} unchanged")
+            return changeset
+            
+        except Error as e:
+            print(f"❌ Sync error: {e}")
+            self.connection.rollback()
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+    
     def close_connection(self):
         """Close database connection"""
         if self.connection and self.connection.is_connected():
             self.connection.close()
             print("🔌 Database connection closed")
 
+def _clean_file_worker(csv_file, chunk_size, queue, stop):
+    """Process pool task: stream one CSV file's cleaned chunks into queue until stop is set"""
+    def put(item):
+        # Wait for room in the queue, giving up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                pass
+        return False
+    
+    try:
+        for chunk in DatasetImporter(csv_file).iter_clean_chunks(chunk_size):
+            if not put((csv_file, chunk)):
+                return
+    except Exception as e:
+        if not put((csv_file, e)):
+            return
+    put((csv_file, None))
+
 def main():
     """Main function to run the import"""
+    parser = argparse.ArgumentParser(description='Import marketplace CSV dumps into the products table')
+    parser.add_argument('csv_files', nargs='*',
+                        default=[os.path.join(os.path.dirname(__file__), 'Skincare_Dataset.csv')],
+                        help='CSV files to import (default: Skincare_Dataset.csv)')
+    parser.add_argument('--chunk-size', type=int, default=DatasetImporter.CHUNK_ROWS,
+                        help='CSV rows read and cleaned at a time')
+    parser.add_argument('--batch-size', type=int, default=DatasetImporter.INSERT_BATCH_ROWS,
+                        help='Rows sent per INSERT batch')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes cleaning input files in parallel')
+    parser.add_argument('--sync', action='store_true',
+                        help='Upsert changed rows by source key instead of replacing the table')
+    parser.add_argument('--keep-missing', action='store_true',
+                        help='With --sync, keep products that are no longer in the input')
+    parser.add_argument('--changeset', help='With --sync, write the changeset as JSON to this file')
+    args = parser.parse_args()
+    
     print("🚀 Starting Skincare Dataset Import")
     print("=" * 50)
     
-    # Get CSV file path
-    csv_file = os.path.join(os.path.dirname(__file__), 'Skincare_Dataset.csv')
-    
-    if not os.path.exists(csv_file):
-        print(f"❌ CSV file not found: {csv_file}")
-        return False
+    for csv_file in args.csv_files:
+        if not os.path.exists(csv_file):
+            print(f"❌ CSV file not found: {csv_file}")
+            return False
     
     # Initialize importer
-    importer = DatasetImporter(csv_file)
+    importer = DatasetImporter(args.csv_files[0])
     
     try:
         # Connect to database
         if not importer.connect_database():
             return False
         
-        # Load and clean data
-        df = importer.load_and_clean_data()
-        if df is None:
-            return False
-        
-        # Import data
-        success = importer.import_data(df)
+        # Load, clean and import data a chunk at a time
+        print(f"📂 Streaming {len(args.csv_files)} file(s) in chunks of {args.chunk_size} rows")
+        chunks = DatasetImporter.iter_clean_files(args.csv_files, args.workers, args.chunk_size)
+        if args.sync:
+            # Running app nodes pick the synced rows up through their updated_at watermark
+            # (RecommenderHolder.sync_catalog); no restart is needed
+            changeset = importer.sync_data(chunks, args.batch_size, delete_missing=not args.keep_missing)
+            success = changeset is not None
+            if success and args.changeset:
+                with open(args.changeset, 'w', encoding='utf-8') as file:
+                    json.dump(changeset, file)
+                print(f"📝 Changeset written to: {args.changeset}")
+        else:
+            success = importer.import_data(chunks, args.batch_size)
         
         if success:
             print("\n🎉 Dataset import completed successfully!")
             print("✅ You can now run the Flask application")
+            print("💡 Run database/build_recommender_artifacts.py to prebuild the recommender model")
         else:
             print("\n❌ Dataset import failed")
         
@@ -263,4 +481,4 @@ def main():
 
 if __name__ == "__main__":
     success = main()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Precompute Recommendations Script for Skincare Recommendation System
+Scores every keyword-free preference profile and stores the top-N products
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path to import config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config.config import Config
+from app.models.models import PrecomputedRecommendation
+from app.utils.recommender import SkincareRecommender
+
+def main():
+    """Main function to run the batch job"""
+    parser = argparse.ArgumentParser(description='Precompute recommendations for all enum profiles')
+    parser.add_argument('--top-n', type=int, default=Config.PRECOMPUTED_TOP_N,
+                        help='Products stored per profile (default: PRECOMPUTED_TOP_N)')
+    args = parser.parse_args()
+
+    print("🚀 Precomputing Recommendations")
+    print("=" * 50)
+
+    recommender = SkincareRecommender()
+    if not recommender.load_products(use_artifacts=True):
+        print("❌ No products found in database")
+        return False
+    print(f"🧠 Model ready with {recommender.active_count} products")
+
+    start = time.perf_counter()
+    rows = recommender.compute_precomputed_rows(args.top_n)
+    print(f"📊 Scored {len(rows)} profiles in {time.perf_counter() - start:.2f}s")
+
+    if not PrecomputedRecommendation.save_many(rows, recommender.catalog_signature):
+        print("❌ Failed to store precomputed recommendations")
+        return False
+
+    print(f"✅ Stored {PrecomputedRecommendation.count()} profiles "
+          f"(catalog signature {recommender.catalog_signature[:12]})")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
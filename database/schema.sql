@@ -8,6 +8,8 @@ CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 USE skincare_recommendation;
 
 -- Drop tables if they exist (for clean setup)
+DROP TABLE IF EXISTS recommendations;
+DROP TABLE IF EXISTS precomputed_recommendations;
 DROP TABLE IF EXISTS user_preferences;
 DROP TABLE IF EXISTS products;
 DROP TABLE IF EXISTS users;
@@ -47,12 +49,20 @@ CREATE TABLE products (
     link_produk TEXT,
     harga INT NOT NULL,
     deskripsi_produk TEXT,
+    source_key CHAR(40) NULL,  -- SHA-1 of link_produk (or no_urut), import identity
+    content_hash CHAR(40) NULL,  -- SHA-1 of the imported column values
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
-    INDEX idx_brand (brand),
-    INDEX idx_harga (harga),
-    INDEX idx_rating (rating_bintang),
+    UNIQUE KEY uq_source_key (source_key),
+    -- Admin listing keyset pagination: (sort column, id), optionally behind a brand filter
+    INDEX idx_rating_id (rating_bintang, id),
+    INDEX idx_harga_id (harga, id),
+    INDEX idx_nama_id (nama_produk, id),
+    INDEX idx_brand_rating_id (brand, rating_bintang, id),
+    INDEX idx_brand_harga_id (brand, harga, id),
+    INDEX idx_brand_nama_id (brand, nama_produk, id),
+    INDEX idx_updated_at (updated_at),  -- Delta sync: MAX(updated_at) and updated_at >= watermark
     FULLTEXT idx_nama_deskripsi (nama_produk, deskripsi_produk)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -75,6 +85,35 @@ CREATE TABLE user_preferences (
     INDEX idx_user_id (user_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Table: precomputed_recommendations (top-N per keyword-free preference profile)
+CREATE TABLE precomputed_recommendations (
+    kondisi_kulit ENUM('berminyak', 'kering', 'kombinasi', 'sensitif', 'normal') NOT NULL,
+    masalah_kulit ENUM('jerawat', 'komedo', 'kusam', 'kerutan', 'flek_hitam', 'pori_besar') NOT NULL,
+    preferensi_produk ENUM('cleanser', 'moisturizer', 'serum', 'sunscreen', 'toner', 'semua') NOT NULL,
+    rentang_harga ENUM('0-50000', '50000-100000', '100000-200000', '200000-500000', '500000+') NOT NULL,
+    catalog_signature CHAR(40) NOT NULL,
+    product_ids TEXT NOT NULL,
+    scores TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (kondisi_kulit, masalah_kulit, preferensi_produk, rentang_harga)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Table: recommendations (log of products served to users, written in batches)
+CREATE TABLE recommendations (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,  -- No foreign key: the log outlives products removed by the importer
+    score DECIMAL(5,3),
+    reason TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_user_product (user_id, product_id),
+    INDEX idx_score (score),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Insert default admin
 INSERT INTO admin (username, password, nama_admin) VALUES 
 ('admin', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewdBPj/RK.s5uO.G', 'Administrator');
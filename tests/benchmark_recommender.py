@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark latency rekomendasi pada katalog sintetis berbagai ukuran
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.utils.knn import IVFIndex, measure_recall
+from app.utils.recommender import SkincareRecommender
+
+KEYWORDS = [
+    'oil', 'control', 'minyak', 'sebum', 'moisturizer', 'pelembab', 'hydrating',
+    'gentle', 'sensitive', 'acne', 'jerawat', 'salicylic', 'brightening', 'vitamin',
+    'retinol', 'wrinkle', 'niacinamide', 'pore', 'facial', 'wash', 'serum', 'toner',
+    'sunscreen', 'cleanser', 'charcoal', 'mint', 'kulit', 'wajah', 'pria', 'segar'
+]
+BRANDS = ['kahf', 'garnier', 'nivea', 'bromen', 'wardah', 'vaseline', 'emina', 'biore']
+
+SAMPLE_PREFERENCES = {
+    'kondisi_kulit': 'berminyak',
+    'masalah_kulit': 'jerawat',
+    'preferensi_produk': 'cleanser',
+    'kata_kunci': ''
+}
+
+
+def generate_products(size, seed=42):
+    """Generate synthetic product dicts shaped like Product.get_all()"""
+    rng = np.random.default_rng(seed)
+    # Letters only: text cleaning strips digits, which would collapse 'kata1', 'kata2', ...
+    filler = np.array(['kata' + ''.join(chr(97 + (i // 26 ** d) % 26) for d in range(3)) for i in range(5000)])
+    keywords = np.array(KEYWORDS)
+    products = []
+    for idx in range(size):
+        words = np.concatenate((rng.choice(keywords, 4), rng.choice(filler, 12)))
+        products.append({
+            'id': idx + 1,
+            'name': ' '.join(words[:4]),
+            'brand': BRANDS[idx % len(BRANDS)],
+            'category': 'skincare',
+            'price': int(rng.integers(10, 500)) * 1000,
+            'description': ' '.join(words[4:]),
+            'rating': round(float(rng.uniform(3.5, 5.0)), 1),
+            'link_produk': f'https://example.com/p/{idx + 1}',
+            'marketplace': 'shopee'
+        })
+    return products
+
+
+def legacy_recommendations(recommender, preferences, max_recommendations=10):
+    """Original iterrows-based ranking, kept for comparison"""
+    user_features = recommender._create_user_profile(preferences)
+    content_similarities = cosine_similarity(user_features, recommender.tfidf_matrix).flatten()
+    product_distances = []
+    for idx, row in recommender.products_df.iterrows():
+        content_score = content_similarities[idx]
+        product_distances.append({
+            'distance': 1 - content_score,
+            'product': row.to_dict(),
+            'content_similarity': content_score,
+            'explanation': recommender._generate_explanation(content_score, preferences)
+        })
+    product_distances.sort(key=lambda x: x['distance'])
+    return product_distances[:max_recommendations]
+
+
+def time_call(func, repeat):
+    """Return the best wall-clock time of func over repeat runs (ms)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='Largest catalog size to run the iterrows baseline on')
+    parser.add_argument('--ivf-lists', type=int, default=0, help='IVF lists (default: sqrt(products))')
+    parser.add_argument('--ivf-probes', type=int, nargs='+', default=[8, 32, 64],
+                        help='IVF probe counts to report recall for')
+    parser.add_argument('--recall-queries', type=int, default=50)
+    parser.add_argument('--vocab-sizes', type=int, nargs='+', default=[1000, 10000, 0],
+                        help='TF-IDF max_features values to compare (0 = every term)')
+    parser.add_argument('--vocab-catalog', type=int, default=100000,
+                        help='Catalog size used for the vocabulary comparison')
+    args = parser.parse_args()
+
+    print(f"{'products':>10} {'build (s)':>10} {'index (s)':>10} {'knn index (ms)':>15} "
+          f"{'postings (ms)':>14} {'brute (ms)':>11} {'hybrid (ms)':>12} {'iterrows (ms)':>14} {'same':>6}")
+    for size in args.sizes:
+        recommender = SkincareRecommender()
+        recommender.use_precomputed = False  # Measure live scoring only
+        recommender.text_cache = None
+        start = time.perf_counter()
+        recommender.load_from_records(generate_products(size))
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        recommender._get_knn_index()
+        index_seconds = time.perf_counter() - start
+        exact_index = recommender._knn_index
+
+        timings = {}
+        results = {}
+        for algorithm in ('index', 'inverted', 'brute'):
+            recommender.knn_algorithm = algorithm
+            recommender._knn_index = exact_index if algorithm == 'index' else None
+            if algorithm != 'brute':
+                recommender._get_knn_index()
+            timings[algorithm], results[algorithm] = time_call(
+                lambda: recommender.get_recommendations(SAMPLE_PREFERENCES, args.top_n), args.repeat)
+        recommender._knn_index = exact_index
+
+        # Content similarity blended with the numeric feature matrix (full scan)
+        recommender.hybrid_scoring = True
+        hybrid_ms, _ = time_call(
+            lambda: recommender.get_recommendations(SAMPLE_PREFERENCES, args.top_n), args.repeat)
+        recommender.hybrid_scoring = False
+
+        fast_ms, fast = timings['index'], results['index']
+        ids = [r['product']['id'] for r in fast]
+        same = all(ids == [r['product']['id'] for r in result] for result in results.values())
+
+        legacy_ms = float('nan')
+        if size <= args.legacy_max:
+            legacy_ms, legacy = time_call(
+                lambda: legacy_recommendations(recommender, SAMPLE_PREFERENCES, args.top_n), 1)
+            same = same and [r['product']['id'] for r in fast] == [r['product']['id'] for r in legacy]
+
+        print(f"{size:>10} {build_seconds:>10.1f} {index_seconds:>10.2f} {fast_ms:>15.2f} "
+              f"{timings['inverted']:>14.2f} {timings['brute']:>11.2f} {hybrid_ms:>12.2f} "
+              f"{legacy_ms:>14.2f} {str(same):>6}")
+
+        stats = recommender.catalog_stats
+        print(f"{'':>10} catalog {stats['bytes_per_product']:.0f} bytes/product "
+              f"(raw {stats['raw_bytes_per_product']:.0f})")
+        
+        # Approximate IVF search: recall@N against the exact index per probe count
+        start = time.perf_counter()
+        ivf = IVFIndex.build(recommender.tfidf_matrix, n_lists=args.ivf_lists)
+        ivf_seconds = time.perf_counter() - start
+        profiles = list(recommender.enum_profiles())[::max(1, 900 // args.recall_queries)]
+        queries = recommender.tfidf_vectorizer.transform([recommender._profile_text(p) for p in profiles])
+        for n_probe in args.ivf_probes:
+            report = measure_recall(ivf, recommender._knn_index, queries, args.top_n, n_probe=n_probe)
+            print(f"{'':>10} ivf {ivf.n_lists} lists (built in {ivf_seconds:.1f}s), {n_probe} probes: "
+                  f"recall@{args.top_n} {report['recall']:.3f}, "
+                  f"{report['index_ms']:.2f}ms vs exact {report['exact_ms']:.2f}ms")
+
+    benchmark_vocabulary(args)
+
+
+def matrix_megabytes(matrix):
+    """Memory held by a CSR matrix (data, indices and indptr) in MB"""
+    return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1024 / 1024
+
+
+def benchmark_vocabulary(args):
+    """Matrix memory and scoring latency of the float32 dot product per vocabulary size"""
+    products = generate_products(args.vocab_catalog)
+    print()
+    print(f"{'vocabulary':>10} {'float32 (MB)':>13} {'float64 (MB)':>13} {'dot (ms)':>9} "
+          f"{'cosine (ms)':>12} {'knn index (ms)':>15}")
+    for max_features in args.vocab_sizes:
+        recommender = SkincareRecommender()
+        recommender.use_precomputed = False
+        recommender.text_cache = None
+        recommender.max_features = max_features
+        recommender.load_from_records(products)
+        matrix = recommender.tfidf_matrix
+        query = recommender._create_user_profile(SAMPLE_PREFERENCES)
+        
+        dot_ms, _ = time_call(lambda: recommender._similarities(query), args.repeat)
+        # Previous scoring path: generic cosine_similarity over a float64 matrix
+        legacy_matrix = matrix.astype(np.float64)
+        legacy_query = query.astype(np.float64)
+        cosine_ms, _ = time_call(lambda: cosine_similarity(legacy_query, legacy_matrix), args.repeat)
+        
+        recommender.knn_algorithm = 'index'
+        recommender._get_knn_index()
+        index_ms, _ = time_call(
+            lambda: recommender.get_recommendations(SAMPLE_PREFERENCES, args.top_n), args.repeat)
+        
+        print(f"{matrix.shape[1]:>10} {matrix_megabytes(matrix):>13.1f} {matrix_megabytes(legacy_matrix):>13.1f} "
+              f"{dot_ms:>9.2f} {cosine_ms:>12.2f} {index_ms:>15.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Uji konsistensi rekomendasi: indeks KNN, paginasi, dan pembaruan inkremental
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config.config import Config
+from app.utils.knn import IVFIndex, InvertedIndex, KNNIndex
+from app.utils.recommender import SkincareRecommender
+from benchmark_recommender import SAMPLE_PREFERENCES, generate_products
+
+CATALOG_SIZE = 400
+TOLERANCE = 1e-5
+
+
+def make_products(size=CATALOG_SIZE):
+    """Produk sintetis dengan kolom yang dipakai skor hybrid dan sinkronisasi"""
+    products = generate_products(size)
+    for product in products:
+        product['terjual'] = f"{product['id'] % 97},000+"
+        product['reviews'] = str(product['id'] % 31)
+        product['updated_at'] = '2024-01-01 00:00:00'
+    return products
+
+
+def make_recommender(products, **attributes):
+    """Model yang dilatih langsung dari records, tanpa database, cache teks, atau tabel precomputed"""
+    recommender = SkincareRecommender()
+    recommender.text_cache = None
+    recommender.use_precomputed = False
+    recommender.hybrid_scoring = False
+    for name, value in attributes.items():
+        setattr(recommender, name, value)
+    recommender.load_from_records(products)
+    return recommender
+
+
+def sample_profiles(recommender, step=45):
+    """Sebagian profil enum ditambah profil dengan kata kunci"""
+    profiles = list(recommender.enum_profiles())[::step]
+    return profiles + [dict(SAMPLE_PREFERENCES, kata_kunci='retinol serum')]
+
+
+def brute_force(matrix, query, n, mask=None):
+    """Tetangga terdekat dengan memindai semua baris, seri diurutkan menurut posisi"""
+    similarities = (matrix @ query.T).toarray().ravel()
+    positions = np.arange(len(similarities)) if mask is None else np.flatnonzero(mask)
+    order = np.lexsort((positions, -similarities[positions]))[:n]
+    return positions[order], similarities[positions[order]]
+
+
+def assert_same_neighbours(result, expected):
+    """Skor sama dengan acuan; produk yang seri di batas bawah boleh berbeda"""
+    positions, similarities = (np.asarray(values) for values in result)
+    expected_positions, expected_similarities = (np.asarray(values) for values in expected)
+    assert len(positions) == len(expected_positions)
+    np.testing.assert_allclose(similarities, expected_similarities, atol=TOLERANCE)
+    if len(positions):
+        boundary = expected_similarities[-1] + TOLERANCE
+        assert (set(positions[similarities > boundary].tolist()) ==
+                set(expected_positions[expected_similarities > boundary].tolist()))
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return make_recommender(make_products())
+
+
+@pytest.mark.parametrize('backend', ['index', 'inverted', 'ivf'])
+def test_knn_backends_match_brute_force(catalog, backend):
+    """Setiap indeks KNN mengembalikan tetangga yang sama dengan pemindaian penuh"""
+    matrix = catalog.tfidf_matrix
+    if backend == 'index':
+        index = KNNIndex.build(matrix, block_size=16)
+    elif backend == 'inverted':
+        index = InvertedIndex(matrix)
+    else:
+        # Probing every list makes IVF exact
+        index = IVFIndex.build(matrix, n_lists=8, n_probe=8)
+
+    mask = np.arange(matrix.shape[0]) % 3 != 0
+    for preferences in sample_profiles(catalog):
+        query = catalog._create_user_profile(preferences)
+        for n in (1, 10, 50):
+            assert_same_neighbours(index.search(query, n), brute_force(matrix, query, n))
+            assert_same_neighbours(index.search(query, n, mask), brute_force(matrix, query, n, mask))
+
+
+@pytest.mark.parametrize('algorithm', ['index', 'inverted', 'ivf'])
+def test_rank_candidates_match_full_scan_after_edits(monkeypatch, algorithm):
+    """Peringkat lewat indeks sama dengan mode brute, juga untuk baris yang diubah setelah indeks dibangun"""
+    monkeypatch.setattr(Config, 'IVF_LISTS', 8)
+    monkeypatch.setattr(Config, 'IVF_PROBES', 8)
+    products = make_products()
+    brute = make_recommender(products, knn_algorithm='brute')
+    indexed = make_recommender(products, knn_algorithm=algorithm)
+    indexed._get_knn_index()
+
+    changes = [
+        ('create', CATALOG_SIZE + 1, dict(products[0], id=CATALOG_SIZE + 1, name='retinol serum baru')),
+        ('update', 2, dict(products[1], description='serum retinol niacinamide')),
+        ('delete', 3, None)
+    ]
+    brute = brute.with_product_changes(changes)
+    indexed = indexed.with_product_changes(changes)
+
+    for preferences in sample_profiles(indexed):
+        for filters in (None, {'min_price': 100000, 'max_price': 300000}):
+            assert_same_neighbours(indexed.rank_candidates(preferences, 20, filters=filters),
+                                   brute.rank_candidates(preferences, 20, filters=filters))
+
+
+@pytest.mark.parametrize('sort_by', ['score', 'price_low', 'price_high', 'rating', 'name'])
+def test_pages_cover_ranking_in_stable_order(catalog, sort_by):
+    """Halaman berurutan memuat setiap kandidat tepat sekali; nilai seri tetap dalam urutan relevansi"""
+    ranked = catalog.rank_candidates(SAMPLE_PREFERENCES, 45)
+    ranked_ids = [int(product_id) for product_id in catalog._ids_at(ranked[0])]
+
+    pages = [catalog.get_recommendation_page(ranked, SAMPLE_PREFERENCES, sort_by, page, per_page=10)
+             for page in range(1, 6)]
+    assert all(page['pages'] == 5 and page['total'] == 45 for page in pages)
+    products = [item['product'] for page in pages for item in page['recommendations']]
+    ids = [product['id'] for product in products]
+    assert sorted(ids) == sorted(ranked_ids)
+
+    if sort_by == 'score':
+        assert ids == ranked_ids
+    else:
+        column, descending = SkincareRecommender.SORT_KEYS[sort_by]
+        values = {product['id']: product[column] for product in products}
+        if column == 'name':
+            key = lambda product_id: values[product_id].lower()
+        else:
+            key = lambda product_id: -values[product_id] if descending else values[product_id]
+        # sorted() is stable, so ties keep the relevance order
+        assert ids == sorted(ranked_ids, key=key)
+
+    again = catalog.get_recommendation_page(ranked, SAMPLE_PREFERENCES, sort_by, 3, per_page=10)
+    assert [item['product']['id'] for item in again['recommendations']] == ids[20:30]
+
+
+@pytest.mark.parametrize('sort_by', ['relevance', 'price_low', 'name'])
+def test_search_pages_are_stable(catalog, sort_by):
+    """Paginasi pencarian produk tidak mengulang atau melewatkan produk"""
+    full = catalog.search_products('serum', page=1, per_page=CATALOG_SIZE, sort_by=sort_by)
+    assert full['total'] > 20
+
+    ids = []
+    for page in range(1, full['total'] // 7 + 2):
+        ids += catalog.search_products('serum', page=page, per_page=7, sort_by=sort_by)['ids']
+    assert ids == full['ids']
+
+
+def test_incremental_changes_match_rebuild(tmp_path):
+    """Create/update/delete inkremental menghasilkan katalog yang sama dengan membangun ulang"""
+    products = make_products()
+    edited = make_recommender(products)
+    current = {product['id']: product for product in products}
+
+    # Extremes of the hybrid signals are rewritten or removed
+    changes = [
+        [('create', CATALOG_SIZE + 1, dict(products[0], id=CATALOG_SIZE + 1, name='serum niacinamide baru',
+                                            price=1000, terjual='900,000+'))],
+        [('update', 5, dict(products[4], price=999000, description='retinol kulit kering'))],
+        [('delete', 6, None)],
+        [('update', CATALOG_SIZE + 1, dict(products[0], id=CATALOG_SIZE + 1, name='toner segar', price=50000)),
+         ('delete', 5, None),
+         ('create', CATALOG_SIZE + 2, dict(products[9], id=CATALOG_SIZE + 2, rating=3.0))]
+    ]
+    for batch in changes:
+        edited = edited.with_product_changes(batch)
+        for action, product_id, product in batch:
+            if action == 'delete':
+                del current[product_id]
+            else:
+                current[product_id] = product
+
+    active = np.flatnonzero(edited.active_mask)
+    ids = [int(product_id) for product_id in edited._ids_at(active)]
+    assert sorted(ids) == sorted(current) and edited.active_count == len(current)
+
+    # Same TF-IDF rows and document frequencies as vectorizing the current catalog
+    frame = edited._preprocess_frame(pd.DataFrame([current[product_id] for product_id in ids]))
+    expected = edited.tfidf_vectorizer.transform(frame['combined_text'])
+    assert abs(edited._row_vectors(active) - expected).max() < TOLERANCE
+    np.testing.assert_array_equal(
+        edited.doc_freq, np.bincount(expected.indices, minlength=len(edited.doc_freq)))
+
+    # Hybrid signals normalized over the live catalog only
+    rebuilt = make_recommender(list(current.values()))
+    np.testing.assert_allclose(edited.feature_ranges, rebuilt.feature_ranges)
+    weights = np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32)
+    scores = dict(zip(ids, edited._feature_scores(weights)[active]))
+    rebuilt_scores = rebuilt._feature_scores(weights)
+    for product_id, score in zip(rebuilt.product_ids, rebuilt_scores):
+        assert abs(scores[int(product_id)] - score) < TOLERANCE
+
+    # Rankings and search equal the same catalog written out and reloaded as one segment
+    edited.save_artifacts(str(tmp_path))
+    reloaded = SkincareRecommender()
+    reloaded.text_cache = None
+    reloaded.use_precomputed = False
+    reloaded.hybrid_scoring = False
+    assert reloaded.load_artifacts(str(tmp_path))
+
+    for preferences in sample_profiles(edited):
+        for filters in (None, {'brand': 'kahf'}, {'min_price': 100000, 'max_price': 300000}):
+            positions, similarities = edited.rank_candidates(preferences, 15, filters=filters)
+            reloaded_positions, reloaded_similarities = reloaded.rank_candidates(preferences, 15, filters=filters)
+            assert_same_neighbours((edited._ids_at(positions), similarities),
+                                   (reloaded._ids_at(reloaded_positions), reloaded_similarities))
+    for query in ('serum', 'toner segar', 'retinol'):
+        result = edited.search_products(query, per_page=CATALOG_SIZE)
+        reloaded_result = reloaded.search_products(query, per_page=CATALOG_SIZE)
+        assert result['total'] == reloaded_result['total']
+        assert sorted(result['ids']) == sorted(reloaded_result['ids'])